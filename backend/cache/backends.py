@@ -0,0 +1,274 @@
+"""Disk storage backends for cache.file_cache."""
+import base64
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+# (ts, data, size) as returned by every backend's get(); size is the
+# estimated heap size of the decoded value (byte length for bytes values),
+# used for memory-tier accounting
+Entry = tuple[float, object, int]
+
+# FileBackend files start with the write timestamp: {"ts": 1700000000.123, ...}
+_FILE_TS = re.compile(rb'\{"ts": ([0-9.eE+-]+)')
+
+# SQLiteBackend.entries.compressed: how value is encoded
+_JSON, _ZLIB_JSON, _RAW_BYTES = 0, 1, 2
+
+
+def decoded_size(raw: bytes) -> int:
+    """
+    Estimated heap bytes of json.loads(raw). Decoded values are 2.5–7x their
+    JSON length (boxed floats, per-list and per-dict overhead), so each
+    element, list and object adds its rough CPython cost to the text length.
+    """
+    return len(raw) + 24 * raw.count(b",") + 72 * raw.count(b"[") + 160 * raw.count(b"{")
+
+
+class FileBackend:
+    """One JSON file per key, named by the md5 of the key. bytes values are stored base64-encoded."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def _path(self, key: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        safe = hashlib.md5(key.encode()).hexdigest()
+        return self.directory / f"{safe}.json"
+
+    def get(self, key: str) -> Optional[Entry]:
+        p = self._path(key)
+        try:
+            text = p.read_bytes()
+        except FileNotFoundError:
+            return None
+        meta = json.loads(text)
+        if "bytes" in meta:
+            data = base64.b64decode(meta["bytes"])
+            return meta["ts"], data, len(data)
+        return meta["ts"], meta["data"], decoded_size(text)
+
+    def set(self, key: str, data, ts: float, expires_at: float) -> int:
+        p = self._path(key)
+        if isinstance(data, bytes):
+            text = json.dumps({"ts": ts, "bytes": base64.b64encode(data).decode()}).encode()
+        else:
+            text = json.dumps({"ts": ts, "data": data}).encode()
+        # Write-then-rename so readers never see a partial file
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(text)
+        os.replace(tmp, p)
+        return len(data) if isinstance(data, bytes) else decoded_size(text)
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def versions(self, keys: list[str]) -> dict[str, float]:
+        """Write timestamp of each present key, read from the file head without parsing the value."""
+        found = {}
+        for key in keys:
+            try:
+                with open(self._path(key), "rb") as f:
+                    match = _FILE_TS.match(f.read(64))
+            except FileNotFoundError:
+                continue
+            if match:
+                found[key] = float(match.group(1))
+        return found
+
+    def get_many(self, keys: list[str]) -> dict[str, Entry]:
+        found = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                found[key] = entry
+        return found
+
+    def set_many(self, items: dict, ts: float, expires_at: dict[str, float]) -> dict[str, int]:
+        return {key: self.set(key, data, ts, expires_at[key]) for key, data in items.items()}
+
+    def sweep(self) -> int:
+        return 0
+
+
+class SQLiteBackend:
+    """
+    Single SQLite database in WAL mode.
+    Values are JSON, zlib-compressed when compress_level > 0; bytes values
+    (already-encoded payloads such as tiles) are stored as-is. expires_at is
+    indexed so expired rows are removed by a background sweep rather than on
+    read, and accessed_at drives LRU eviction once max_bytes is exceeded.
+    """
+
+    # Reads refresh accessed_at at most this often, to avoid a write per hit
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path: Path, max_bytes: int = 0, compress_level: int = 6, sweep_interval: int = 300):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self._local = threading.local()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    ts REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    raw_size INTEGER NOT NULL,
+                    compressed INTEGER NOT NULL,
+                    value BLOB NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+            # Running SUM(size), kept by triggers in the writing transaction so
+            # eviction checks never scan entries
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO totals SELECT 0, COALESCE(SUM(size), 0) FROM entries")
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_size_insert AFTER INSERT ON entries "
+                "BEGIN UPDATE totals SET bytes = bytes + NEW.size; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_size_update AFTER UPDATE OF size ON entries "
+                "BEGIN UPDATE totals SET bytes = bytes + NEW.size - OLD.size; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_size_delete AFTER DELETE ON entries "
+                "BEGIN UPDATE totals SET bytes = bytes - OLD.size; END"
+            )
+        if sweep_interval > 0:
+            threading.Thread(target=self._sweep_loop, args=(sweep_interval,), daemon=True).start()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _encode(self, data) -> tuple[bytes, int, int, int]:
+        """(value, compressed, raw length, memory-tier size) for storing data."""
+        if isinstance(data, bytes):
+            return data, _RAW_BYTES, len(data), len(data)
+        raw = json.dumps(data).encode()
+        if self.compress_level > 0:
+            return zlib.compress(raw, self.compress_level), _ZLIB_JSON, len(raw), decoded_size(raw)
+        return raw, _JSON, len(raw), decoded_size(raw)
+
+    @staticmethod
+    def _decode(value: bytes, compressed: int) -> tuple[object, int]:
+        """(data, memory-tier size) for a stored value."""
+        if compressed == _RAW_BYTES:
+            return bytes(value), len(value)
+        raw = zlib.decompress(value) if compressed == _ZLIB_JSON else value
+        return json.loads(raw), decoded_size(raw)
+
+    def get(self, key: str) -> Optional[Entry]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list[str]) -> dict[str, Entry]:
+        if not keys:
+            return {}
+        conn = self._conn()
+        now = time.time()
+        found = {}
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, ts, accessed_at, compressed, value FROM entries WHERE key IN ({marks})",
+                chunk,
+            ).fetchall()
+            stale = []
+            for key, ts, accessed_at, compressed, value in rows:
+                found[key] = (ts, *self._decode(value, compressed))
+                if now - accessed_at > self.TOUCH_INTERVAL:
+                    stale.append((now, key))
+            if stale:
+                conn.executemany("UPDATE entries SET accessed_at = ? WHERE key = ?", stale)
+        return found
+
+    def versions(self, keys: list[str]) -> dict[str, float]:
+        """Write timestamp of each present key, without reading or decoding values."""
+        conn = self._conn()
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            found.update(conn.execute(f"SELECT key, ts FROM entries WHERE key IN ({marks})", chunk).fetchall())
+        return found
+
+    def set(self, key: str, data, ts: float, expires_at: float) -> int:
+        return self.set_many({key: data}, ts, {key: expires_at})[key]
+
+    def set_many(self, items: dict, ts: float, expires_at: dict[str, float]) -> dict[str, int]:
+        rows, sizes = [], {}
+        for key, data in items.items():
+            value, compressed, raw_size, sizes[key] = self._encode(data)
+            rows.append((key, ts, expires_at[key], ts, len(value), raw_size, compressed, value))
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete skips triggers
+            conn.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "ts = excluded.ts, expires_at = excluded.expires_at, accessed_at = excluded.accessed_at, "
+                "size = excluded.size, raw_size = excluded.raw_size, compressed = excluded.compressed, "
+                "value = excluded.value",
+                rows,
+            )
+        if self.max_bytes:
+            self._evict(conn)
+        return sizes
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least-recently-accessed rows until the total fits max_bytes."""
+        total = conn.execute("SELECT bytes FROM totals").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        victims, freed = [], 0
+        cursor = conn.execute("SELECT key, size FROM entries ORDER BY accessed_at")
+        for key, size in cursor:
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        cursor.close()
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def sweep(self) -> int:
+        """Delete expired rows and enforce max_bytes. Returns rows expired."""
+        conn = self._conn()
+        expired = conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),)).rowcount
+        if self.max_bytes:
+            self._evict(conn)
+        return expired
+
+    def _sweep_loop(self, interval: int) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except sqlite3.Error:
+                pass
@@ -1,29 +1,286 @@
-import json
-import hashlib
+import asyncio
+import os
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
+
+from cache.backends import FileBackend, SQLiteBackend
 
 CACHE_DIR = Path(__file__).parent / "_data"
 CACHE_TTL = 86400  # 24 hours
 
 
-def _cache_path(key: str) -> Path:
-    CACHE_DIR.mkdir(exist_ok=True)
-    safe = hashlib.md5(key.encode()).hexdigest()
-    return CACHE_DIR / f"{safe}.json"
+def _ttl_env(namespace: str, soft: int, hard: int) -> tuple[int, int]:
+    """Read CACHE_TTL_<NAMESPACE>="soft,hard" (seconds), falling back to the defaults."""
+    raw = os.getenv(f"CACHE_TTL_{namespace.upper()}")
+    if not raw:
+        return soft, hard
+    soft_s, hard_s = raw.split(",")
+    return int(soft_s), int(hard_s)
 
 
-def cache_get(key: str):
-    p = _cache_path(key)
-    if not p.exists():
+# (soft, hard) TTL per key namespace (the prefix before the first ":").
+# Past soft, entries are served stale while a background refresh runs;
+# past hard, they are gone and the next caller rebuilds synchronously.
+CACHE_TTLS: dict[str, tuple[int, int]] = {
+    "acs": _ttl_env("acs", 7 * 86400, 90 * 86400),
+    "tiger": _ttl_env("tiger", 30 * 86400, 365 * 86400),
+    "overpass": _ttl_env("overpass", CACHE_TTL, 7 * CACHE_TTL),
+    "gap": _ttl_env("gap", CACHE_TTL, 7 * CACHE_TTL),
+    "photon": _ttl_env("photon", 30 * 86400, 180 * 86400),
+}
+# Byte budget for the in-process tier, against each decoded value's estimated
+# heap size (backends.decoded_size), not its JSON length
+CACHE_MEMORY_BYTES = int(os.getenv("CACHE_MEMORY_BYTES", str(256 * 1024 * 1024)))
+# Disk tier: "sqlite" (single WAL database) or "file" (one JSON file per key)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+CACHE_COMPRESS_LEVEL = int(os.getenv("CACHE_COMPRESS_LEVEL", "6"))
+CACHE_SWEEP_INTERVAL = int(os.getenv("CACHE_SWEEP_INTERVAL", "300"))
+# Threads for disk reads/writes (JSON parse, compression) from async code
+CACHE_IO_WORKERS = int(os.getenv("CACHE_IO_WORKERS", "4"))
+
+
+class _MemoryTier:
+    """
+    Process-local LRU of decoded values in front of the disk tier.
+    Entries keep the disk timestamp so they go stale and expire at the same
+    moment. Returned values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[float, object, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[tuple[float, object]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            ts, data, _size = entry
+            if time.time() - ts > ttl_for(key)[1]:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return ts, data
+
+    def peek_ts(self, key: str) -> Optional[float]:
+        """Timestamp of a live entry, leaving hit/miss counters and LRU order untouched."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > ttl_for(key)[1]:
+                return None
+            return entry[0]
+
+    def put(self, key: str, ts: float, data, size: int) -> None:
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (ts, data, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _make_backend():
+    if CACHE_BACKEND == "file":
+        return FileBackend(CACHE_DIR)
+    if CACHE_BACKEND == "sqlite":
+        return SQLiteBackend(
+            CACHE_DIR / "cache.sqlite3",
+            max_bytes=CACHE_MAX_BYTES,
+            compress_level=CACHE_COMPRESS_LEVEL,
+            sweep_interval=CACHE_SWEEP_INTERVAL,
+        )
+    raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
+
+
+_memory = _MemoryTier(CACHE_MEMORY_BYTES)
+_backend = _make_backend()
+_io_pool = ThreadPoolExecutor(max_workers=CACHE_IO_WORKERS, thread_name_prefix="cache-io")
+
+
+def ttl_for(key: str) -> tuple[int, int]:
+    """(soft, hard) TTL for a cache key, by namespace."""
+    return CACHE_TTLS.get(key.split(":", 1)[0], (CACHE_TTL, CACHE_TTL))
+
+
+def _read(key: str) -> Optional[tuple[float, object]]:
+    """(ts, data) from memory or disk, or None if absent or past the hard TTL."""
+    entry = _memory.get(key)
+    if entry is not None:
+        return entry
+    return _read_disk(key)
+
+
+def _read_disk(key: str) -> Optional[tuple[float, object]]:
+    stored = _backend.get(key)
+    if stored is None:
         return None
-    meta = json.loads(p.read_text())
-    if time.time() - meta["ts"] > CACHE_TTL:
-        p.unlink(missing_ok=True)
+    ts, data, size = stored
+    if time.time() - ts > ttl_for(key)[1]:
+        _backend.delete(key)
         return None
-    return meta["data"]
+    _memory.put(key, ts, data, size)
+    return ts, data
+
+
+def _with_freshness(key: str, entry: Optional[tuple[float, object]]) -> tuple[object, bool]:
+    if entry is None:
+        return None, False
+    ts, data = entry
+    return data, time.time() - ts <= ttl_for(key)[0]
+
+
+def cache_lookup(key: str) -> tuple[object, bool]:
+    """Return (data, fresh). data is None on a miss; fresh is False past the soft TTL."""
+    return _with_freshness(key, _read(key))
+
+
+async def cache_lookup_async(key: str) -> tuple[object, bool]:
+    """cache_lookup that parses disk entries on the I/O pool instead of the event loop."""
+    entry = _memory.get(key)
+    if entry is None:
+        entry = await asyncio.get_running_loop().run_in_executor(_io_pool, _read_disk, key)
+    return _with_freshness(key, entry)
+
+
+def cache_get(key: str):
+    """Return cached data, including stale entries that are still within the hard TTL."""
+    entry = _read(key)
+    return entry[1] if entry is not None else None
 
 
 def cache_set(key: str, data) -> None:
-    p = _cache_path(key)
-    p.write_text(json.dumps({"ts": time.time(), "data": data}))
+    """Store JSON-serializable data, or bytes which are kept verbatim."""
+    ts = time.time()
+    size = _backend.set(key, data, ts, ts + ttl_for(key)[1])
+    _memory.put(key, ts, data, size)
+
+
+async def cache_set_async(key: str, data) -> None:
+    """cache_set with serialization and the disk write on the I/O pool."""
+    await asyncio.get_running_loop().run_in_executor(_io_pool, cache_set, key, data)
+
+
+def _read_many(keys: list[str]) -> dict[str, tuple[float, object]]:
+    found, missing = {}, []
+    for key in keys:
+        entry = _memory.get(key)
+        if entry is not None:
+            found[key] = entry
+        else:
+            missing.append(key)
+
+    now = time.time()
+    for key, (ts, data, size) in _backend.get_many(missing).items():
+        if now - ts > ttl_for(key)[1]:
+            _backend.delete(key)
+            continue
+        _memory.put(key, ts, data, size)
+        found[key] = (ts, data)
+    return found
+
+
+def cache_lookup_many(keys: list[str]) -> dict[str, tuple[object, bool]]:
+    """Bulk cache_lookup; returns {key: (data, fresh)} for keys that are present."""
+    return {key: _with_freshness(key, entry) for key, entry in _read_many(keys).items()}
+
+
+async def cache_lookup_many_async(keys: list[str]) -> dict[str, tuple[object, bool]]:
+    """cache_lookup_many on the I/O pool."""
+    return await asyncio.get_running_loop().run_in_executor(_io_pool, cache_lookup_many, keys)
+
+
+def cache_set_many(items: dict) -> None:
+    """Bulk cache_set in one backend write."""
+    if not items:
+        return
+    ts = time.time()
+    sizes = _backend.set_many(items, ts, {key: ts + ttl_for(key)[1] for key in items})
+    for key, data in items.items():
+        _memory.put(key, ts, data, sizes[key])
+
+
+async def cache_set_many_async(items: dict) -> None:
+    """cache_set_many on the I/O pool."""
+    await asyncio.get_running_loop().run_in_executor(_io_pool, cache_set_many, items)
+
+
+def _versions_in_memory(keys: list[str]) -> dict[str, float]:
+    found = {}
+    for key in keys:
+        ts = _memory.peek_ts(key)
+        if ts is not None:
+            found[key] = ts
+    return found
+
+
+def _versions_on_disk(keys: list[str]) -> dict[str, float]:
+    now = time.time()
+    return {key: ts for key, ts in _backend.versions(keys).items() if now - ts <= ttl_for(key)[1]}
+
+
+def cache_versions(keys: list[str]) -> dict[str, float]:
+    """
+    Write timestamp of each present, unexpired key; changes whenever the entry
+    is rewritten. Values are never read from disk or decoded.
+    """
+    found = _versions_in_memory(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        found.update(_versions_on_disk(missing))
+    return found
+
+
+async def cache_versions_async(keys: list[str]) -> dict[str, float]:
+    """cache_versions, touching disk (on the I/O pool) only for keys not in memory."""
+    found = _versions_in_memory(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        found.update(await asyncio.get_running_loop().run_in_executor(_io_pool, _versions_on_disk, missing))
+    return found
+
+
+async def run_io(fn, *args):
+    """Run a blocking cache read/write on the I/O pool."""
+    return await asyncio.get_running_loop().run_in_executor(_io_pool, fn, *args)
+
+
+def cache_stats() -> dict:
+    """Hit/miss/eviction counters for the memory tier."""
+    return {"backend": CACHE_BACKEND, "memory": _memory.stats()}
@@ -0,0 +1,66 @@
+"""
+Binary tract geometry store: one GeoParquet file (WKB geometry) per county,
+with precomputed centroid and bbox columns, so warm loads are a vectorized
+read instead of a GeoJSON parse.
+"""
+import os
+import time
+from typing import Optional
+
+import geopandas as gpd
+import shapely
+
+from cache.file_cache import CACHE_DIR, run_io, ttl_for
+
+GEO_DIR = CACHE_DIR / "tracts"
+
+
+def _path(key: str):
+    # key is "tiger:{state}:{county}"
+    return GEO_DIR / (key.replace(":", "_") + ".parquet")
+
+
+def with_derived_columns(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Add centroid_lon/centroid_lat and minx/miny/maxx/maxy columns."""
+    geoms = gdf.geometry.values
+    centroids = shapely.centroid(geoms)
+    bounds = shapely.bounds(geoms)
+    gdf = gdf.copy()
+    gdf["centroid_lon"] = shapely.get_x(centroids)
+    gdf["centroid_lat"] = shapely.get_y(centroids)
+    gdf["minx"], gdf["miny"], gdf["maxx"], gdf["maxy"] = bounds.T
+    return gdf
+
+
+def read_tracts(key: str) -> Optional[tuple[float, gpd.GeoDataFrame]]:
+    """(written_at, GeoDataFrame) or None if missing or past the tiger hard TTL."""
+    p = _path(key)
+    try:
+        ts = p.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    if time.time() - ts > ttl_for(key)[1]:
+        p.unlink(missing_ok=True)
+        return None
+    return ts, gpd.read_parquet(p)
+
+
+def write_tracts(key: str, gdf: gpd.GeoDataFrame) -> None:
+    GEO_DIR.mkdir(parents=True, exist_ok=True)
+    p = _path(key)
+    tmp = p.with_suffix(f".{os.getpid()}.tmp")
+    gdf.to_parquet(tmp, index=False)
+    os.replace(tmp, p)
+
+
+async def lookup_tracts_async(key: str) -> tuple[Optional[gpd.GeoDataFrame], bool]:
+    """get_or_build lookup: (GeoDataFrame or None, fresh)."""
+    entry = await run_io(read_tracts, key)
+    if entry is None:
+        return None, False
+    ts, gdf = entry
+    return gdf, time.time() - ts <= ttl_for(key)[0]
+
+
+async def write_tracts_async(key: str, gdf: gpd.GeoDataFrame) -> None:
+    await run_io(write_tracts, key, gdf)
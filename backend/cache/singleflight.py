@@ -0,0 +1,73 @@
+"""Coalesce concurrent cold builds so each cache key is fetched once."""
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+
+from cache.file_cache import cache_lookup_async
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+_inflight: dict[str, asyncio.Task] = {}
+_refreshing: set[asyncio.Task] = set()
+
+
+async def single_flight(key: str, fn: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run fn() once per key at a time; concurrent callers await the same task.
+    The shared task is shielded, so a caller disconnecting does not cancel
+    the build for everyone else. Exceptions propagate to every waiter.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fn())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+    return await asyncio.shield(task)
+
+
+async def get_or_build(
+    key: str,
+    build: Callable[[], Awaitable[T]],
+    lookup: Callable[[str], Awaitable[tuple[object, bool]]] = cache_lookup_async,
+) -> T:
+    """
+    Stale-while-revalidate read through the cache.
+    Fresh hits return immediately; stale hits return immediately and schedule
+    one background build; misses await a single-flight build. build() is
+    responsible for storing its result.
+    """
+    data, fresh = await lookup(key)
+    if data is not None:
+        if not fresh:
+            _refresh(key, build, lookup)
+        return data
+    return await single_flight(key, lambda: _build_unless_fresh(key, build, lookup))
+
+
+async def _build_unless_fresh(key: str, build, lookup):
+    # A build for this key may have finished between our lookup and joining the flight
+    data, fresh = await lookup(key)
+    if data is not None and fresh:
+        return data
+    return await build()
+
+
+def _refresh(key: str, build, lookup) -> None:
+    run_in_background(key, lambda: _build_unless_fresh(key, build, lookup))
+
+
+def run_in_background(key: str, fn: Callable[[], Awaitable]) -> None:
+    """Start a single-flight fn() for key without waiting; failures are logged."""
+    task = asyncio.ensure_future(single_flight(key, fn))
+    _refreshing.add(task)
+    task.add_done_callback(_refresh_done(key))
+
+
+def _refresh_done(key: str):
+    def done(task: asyncio.Task) -> None:
+        _refreshing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background refresh of %s failed: %r", key, task.exception())
+    return done
@@ -1,18 +1,39 @@
 """FastAPI application entry point."""
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from routers.counties import router as counties_router
-from routers.gap import router as gap_router
-from routers.tracts import router as tracts_router
+from cache.file_cache import cache_stats
+from routers.counties import router as counties_router, warm_up as warm_up_counties
+from routers.gap import build_stats as gap_build_stats, router as gap_router
+from routers.tracts import router as tracts_router, warm_up as warm_up_tracts
+from services.executors import Overloaded, executor_stats, shutdown_executors
+from services.http import close_clients, open_clients
+from services import static_data
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_clients()
+    static_data.load()
+    warm_up_counties()
+    await asyncio.to_thread(warm_up_tracts)
+    yield
+    await close_clients()
+    shutdown_executors()
+
 
 app = FastAPI(
     title="Service Gap Dashboard API",
     description="Civic deserts analysis: Census vulnerability + OSM infrastructure",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -23,6 +44,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # Shed load instead of queueing unbounded scoring work behind the pool
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy building other counties, retry shortly"},
+        headers={"Retry-After": "5"},
+    )
+
+
 app.include_router(counties_router, prefix="/api")
 app.include_router(gap_router, prefix="/api")
 app.include_router(tracts_router, prefix="/api")
@@ -31,3 +62,13 @@ app.include_router(tracts_router, prefix="/api")
 @app.get("/api/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/api/cache/stats")
+async def cache_statistics():
+    return {
+        **cache_stats(),
+        "executor": executor_stats(),
+        "static": static_data.stats(),
+        "gap_builds": gap_build_stats(),
+    }
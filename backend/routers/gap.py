@@ -1,56 +1,328 @@
 """Gap score endpoints."""
-from fastapi import APIRouter, HTTPException, Query
-from cache.file_cache import cache_get, cache_set
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from cache.file_cache import cache_set_async, cache_set_many_async, cache_versions_async
+from cache.singleflight import get_or_build
 from services.census import fetch_tract_data
 from services.overpass import fetch_pois
-from services.geospatial import fetch_tract_boundaries, get_county_bbox
-from services.gap_calculator import compute_gap_scores, compute_news_gap_scores, get_top_tracts
+from services.geospatial import fetch_counties_in_bbox, fetch_county_bbox, fetch_tract_boundaries, get_county_bbox
+from services.gap_calculator import (
+    SCORE_FIELDS,
+    assemble_feature_collection,
+    build_ranking,
+    compute_gap_table,
+    compute_news_gap_table,
+    geometry_record,
+    page_ranking,
+    select_columns,
+    tolerance_zoom,
+    zoom_precision,
+    zoom_tolerance,
+)
+from services.geocoding import reverse_geocode_many
 from services.news import get_outlet_density
+from services.executors import run_cpu
+from services.responses import cached_json_response
+from services.vector_tiles import (
+    MVT_AVAILABLE,
+    MVT_BUILD_CONCURRENCY,
+    MVT_BUILD_MIN_ZOOM,
+    MVT_MAX_ZOOM,
+    MVT_MIN_ZOOM,
+    encode_tile,
+    tile_bounds,
+)
 
 router = APIRouter(prefix="/gap")
 
-VALID_LAYERS = {"healthcare", "food", "transit", "news"}
+logger = logging.getLogger(__name__)
+
+LAYERS = ("healthcare", "food", "transit", "news")
+VALID_LAYERS = set(LAYERS)
+
+# Browser/CDN freshness for gap GeoJSON responses, in seconds
+GAP_CACHE_MAX_AGE = int(os.getenv("GAP_CACHE_MAX_AGE", "3600"))
+# Recent gap builds whose stage timings are reported by /api/cache/stats
+GAP_BUILD_HISTORY = int(os.getenv("GAP_BUILD_HISTORY", "20"))
+
+_recent_builds: deque = deque(maxlen=GAP_BUILD_HISTORY)
+_build_count = 0
+
+
+def build_stats() -> dict:
+    """Number of gap builds in this process and the stage timings (ms) of the latest, newest first."""
+    return {"builds": _build_count, "recent": list(reversed(_recent_builds))}
+
+
+def _check_fips(fips: str) -> None:
+    if len(fips) != 5 or not fips.isdigit():
+        raise HTTPException(status_code=400, detail="FIPS must be 5-digit string")
+
+
+def _check_layer(layer: str) -> None:
+    if layer not in VALID_LAYERS:
+        raise HTTPException(status_code=400, detail=f"layer must be one of {VALID_LAYERS}")
+
+
+class LevelOfDetail:
+    """Simplification tolerance (degrees) and coordinate precision for served geometry.
+
+    An explicit `simplify` is snapped down to the nearest zoom tolerance so that
+    arbitrary floats share a bounded set of cache entries.
+    """
+
+    def __init__(self, zoom: Optional[int] = None, simplify: Optional[float] = None, precision: Optional[int] = None):
+        level = tolerance_zoom(simplify) if simplify is not None else zoom
+        self.tolerance = zoom_tolerance(level) if level is not None else 0.0
+        if precision is None and zoom is not None:
+            precision = zoom_precision(zoom)
+        self.precision = precision
+        parts = []
+        if level is not None:
+            parts.append(f"z{level}")
+        if precision is not None:
+            parts.append(f"p{precision}")
+        # Cache key suffix; empty for full-resolution geometry
+        self.key = "".join(f":{p}" for p in parts)
+
+
+FULL_DETAIL = LevelOfDetail()
 
 
-async def _build_geojson(fips: str, layer: str) -> dict:
-    cache_key = f"gap:{fips}:{layer}"
-    cached = cache_get(cache_key)
-    if cached is not None:
-        return cached
+def _lod_params(
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Simplify to half a pixel at this web-map zoom"),
+    simplify: Optional[float] = Query(None, gt=0, le=1, description="Simplification tolerance in degrees, snapped to the nearest finer zoom (overrides zoom)"),
+    precision: Optional[int] = Query(None, ge=0, le=9, description="Decimal places kept in coordinates"),
+) -> LevelOfDetail:
+    return LevelOfDetail(zoom, simplify, precision)
+
+
+def _geometry_key(fips: str, lod: LevelOfDetail) -> str:
+    return f"gap:geom:{fips}{lod.key}"
+
+
+def _score_key(fips: str, layer: str) -> str:
+    return f"gap:scores:{fips}:{layer}"
+
+
+def _rank_key(fips: str, layer: str) -> str:
+    return f"gap:rank:{fips}:{layer}"
+
+
+async def _geometry(fips: str, lod: LevelOfDetail = FULL_DETAIL) -> dict:
+    cache_key = _geometry_key(fips, lod)
+    return await get_or_build(cache_key, lambda: _compute_geometry(cache_key, fips, lod))
+
+
+async def _score_table(fips: str, layer: str) -> dict:
+    cache_key = _score_key(fips, layer)
+    # /gap/{fips} and /gap/{fips}/top-tracts arrive together on a cold county
+    return await get_or_build(cache_key, lambda: _compute_table(cache_key, fips, layer))
+
+
+async def _ranking(fips: str, layer: str) -> dict:
+    cache_key = _rank_key(fips, layer)
+    return await get_or_build(cache_key, lambda: _compute_ranking(cache_key, fips, layer))
+
+
+async def _compute_ranking(cache_key: str, fips: str, layer: str) -> dict:
+    """Rank a cached score table; only needed when the ranking was evicted on its own."""
+    table, census_rows = await asyncio.gather(
+        _score_table(fips, layer), fetch_tract_data(fips[:2], fips[2:])
+    )
+    ranking = await run_cpu(build_ranking, table, census_rows)
+    await cache_set_async(cache_key, ranking)
+    return ranking
+
+
+async def _compute_geometry(cache_key: str, fips: str, lod: LevelOfDetail) -> dict:
+    tract_gdf = await fetch_tract_boundaries(fips[:2], fips[2:])
+    if tract_gdf.empty:
+        raise HTTPException(status_code=404, detail=f"No tracts found for FIPS {fips}")
+    geometry = await run_cpu(geometry_record, tract_gdf, lod.tolerance, lod.precision)
+    await cache_set_async(cache_key, geometry)
+    return geometry
+
 
+async def _timed(timings: dict[str, float], stage: str, coro):
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+
+async def _compute_table(cache_key: str, fips: str, layer: str) -> dict:
+    """
+    Build one gap layer's score table. TIGER tracts, ACS rows and (for POI layers) the
+    county bbox → Overpass chain have no dependencies on each other, so they
+    run concurrently; the bbox only falls back to the tracts when TIGER has
+    no county extent. Stage timings are kept for build_stats().
+    """
+    global _build_count
     state_fips = fips[:2]
     county_fips = fips[2:]
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+
+    tracts_task = asyncio.ensure_future(
+        _timed(timings, "tiger", fetch_tract_boundaries(state_fips, county_fips))
+    )
+    acs_task = asyncio.ensure_future(_timed(timings, "acs", fetch_tract_data(state_fips, county_fips)))
+
+    async def pois_for_county() -> list[dict]:
+        bbox = await _timed(timings, "bbox", fetch_county_bbox(fips))
+        if bbox is None:
+            tract_gdf = await tracts_task
+            if tract_gdf.empty:
+                # Unknown county: no extent to query Overpass with
+                raise HTTPException(status_code=404, detail=f"No tracts found for FIPS {fips}")
+            bbox = get_county_bbox(tract_gdf)
+        south, west, north, east = bbox
+        return await _timed(timings, "overpass", fetch_pois(layer, south, west, north, east, fips))
+
+    stages = [tracts_task, acs_task]
+    if layer != "news":
+        stages.append(asyncio.ensure_future(pois_for_county()))
+    try:
+        tract_gdf, census_rows, *rest = await asyncio.gather(*stages)
+    except BaseException:
+        for task in stages:
+            task.cancel()
+        raise
 
-    tract_gdf = await fetch_tract_boundaries(state_fips, county_fips)
     if tract_gdf.empty:
         raise HTTPException(status_code=404, detail=f"No tracts found for FIPS {fips}")
 
-    census_rows = await fetch_tract_data(state_fips, county_fips)
-
+    score_start = time.perf_counter()
     if layer == "news":
         outlet_density, outlet_count = get_outlet_density(fips, census_rows)
-        geojson = compute_news_gap_scores(tract_gdf, census_rows, outlet_density, outlet_count)
+        table = await run_cpu(compute_news_gap_table, tract_gdf, census_rows, outlet_density, outlet_count)
     else:
-        south, west, north, east = get_county_bbox(tract_gdf)
-        pois = await fetch_pois(layer, south, west, north, east, fips)
-        geojson = compute_gap_scores(tract_gdf, census_rows, pois)
+        table = await run_cpu(compute_gap_table, tract_gdf, census_rows, rest[0])
+    ranking = await run_cpu(build_ranking, table, census_rows)
+    timings["score"] = round((time.perf_counter() - score_start) * 1000, 1)
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info("gap build %s/%s stage timings (ms): %s", fips, layer, timings)
+    _build_count += 1
+    _recent_builds.append({"fips": fips, "layer": layer, **timings})
+
+    # The top-tracts ranking is written with its table, so it never needs a rebuild of its own
+    await cache_set_many_async({cache_key: table, _rank_key(fips, layer): ranking})
+    return table
+
+
+async def _tile_bytes(layer: str, z: int, x: int, y: int) -> bytes:
+    cache_key = f"gap:tile:{layer}:{z}:{x}:{y}"
+    return await get_or_build(cache_key, lambda: _compute_tile(cache_key, layer, z, x, y))
+
+
+_tile_build_slots: Optional[asyncio.Semaphore] = None
+
+
+async def _county_tile_parts(fips: str, layer: str, cached: bool):
+    """
+    (tract GeoDataFrame, score table) for one county; None if it has no tracts.
+    Counties without cached scores are built at most MVT_BUILD_CONCURRENCY at a time.
+    """
+    global _tile_build_slots
+    if cached:
+        return await asyncio.gather(fetch_tract_boundaries(fips[:2], fips[2:]), _score_table(fips, layer))
+    if _tile_build_slots is None:
+        _tile_build_slots = asyncio.Semaphore(MVT_BUILD_CONCURRENCY)
+    async with _tile_build_slots:
+        return await asyncio.gather(fetch_tract_boundaries(fips[:2], fips[2:]), _score_table(fips, layer))
+
+
+async def _compute_tile(cache_key: str, layer: str, z: int, x: int, y: int) -> bytes:
+    """
+    Encode one tile from the counties it overlaps. Below MVT_BUILD_MIN_ZOOM only
+    counties with cached scores are drawn; a county whose build fails is left
+    out. A tile missing counties either way is returned but not cached.
+    """
+    counties = await fetch_counties_in_bbox(f"tiger:tile-counties:{z}:{x}:{y}", *tile_bounds(z, x, y))
+    scored = await cache_versions_async([_score_key(fips, layer) for fips in counties])
+    cached = [_score_key(fips, layer) in scored for fips in counties]
+    wanted = [(fips, hit) for fips, hit in zip(counties, cached) if hit or z >= MVT_BUILD_MIN_ZOOM]
+
+    results = await asyncio.gather(
+        *(_county_tile_parts(fips, layer, hit) for fips, hit in wanted), return_exceptions=True
+    )
+    parts = []
+    complete = len(wanted) == len(counties)
+    for (fips, _hit), result in zip(wanted, results):
+        if isinstance(result, HTTPException) and result.status_code == 404:
+            continue
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            logger.warning("tile %s/%s/%s/%s: skipping county %s: %r", layer, z, x, y, fips, result)
+            complete = False
+            continue
+        parts.append(result)
+
+    tile = await run_cpu(encode_tile, layer, z, x, y, parts)
+    if complete:
+        await cache_set_async(cache_key, tile)
+    return tile
+
+
+@router.get("/tiles/{layer}/{z}/{x}/{y}.mvt")
+async def gap_tile(layer: str, z: int, x: int, y: int):
+    """
+    Mapbox Vector Tile of tract gap scores, clipped and simplified for the
+    tile's zoom. From MVT_BUILD_MIN_ZOOM up, counties in view are scored on
+    demand; complete tiles are cached.
+    """
+    _check_layer(layer)
+    if not MVT_MIN_ZOOM <= z <= MVT_MAX_ZOOM:
+        raise HTTPException(status_code=400, detail=f"zoom must be between {MVT_MIN_ZOOM} and {MVT_MAX_ZOOM}")
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="tile x/y out of range for zoom")
+    if not MVT_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Vector tiles need the mapbox-vector-tile package")
 
-    cache_set(cache_key, geojson)
-    return geojson
+    tile = await _tile_bytes(layer, z, x, y)
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile")
 
 
 @router.get("/{fips}")
 async def gap_layer(
+    request: Request,
     fips: str,
     layer: str = Query("healthcare", description="Layer type: healthcare|food|transit|news"),
+    lod: LevelOfDetail = Depends(_lod_params),
 ):
-    """Return tract GeoJSON FeatureCollection with gap_score property."""
-    if len(fips) != 5 or not fips.isdigit():
-        raise HTTPException(status_code=400, detail="FIPS must be 5-digit string")
-    if layer not in VALID_LAYERS:
-        raise HTTPException(status_code=400, detail=f"layer must be one of {VALID_LAYERS}")
+    """
+    Return tract GeoJSON FeatureCollection with gap_score property.
+    Assembled from the county's shared geometry record and the layer's score
+    table, each cached separately so tract polygons are stored once per
+    county (and level of detail) rather than once per layer; the encoded,
+    compressed response is cached on top of those.
+    """
+    _check_fips(fips)
+    _check_layer(layer)
+
+    async def sources():
+        return await asyncio.gather(_geometry(fips, lod), _score_table(fips, layer))
 
-    return await _build_geojson(fips, layer)
+    async def build():
+        return await run_cpu(assemble_feature_collection, *await sources())
+
+    return await cached_json_response(
+        request,
+        f"gap:response:{fips}:{layer}{lod.key}",
+        [_geometry_key(fips, lod), _score_key(fips, layer)],
+        build,
+        GAP_CACHE_MAX_AGE,
+        refresh=sources,
+    )
 
 
 @router.get("/{fips}/top-tracts")
@@ -58,12 +330,71 @@ async def top_tracts(
     fips: str,
     layer: str = Query("healthcare"),
     n: int = Query(5, ge=1, le=20),
+    offset: int = Query(0, ge=0, description="Skip this many matching tracts (pagination)"),
+    min_population: int = Query(0, ge=0, description="Only tracts with at least this ACS population"),
+    min_vulnerability: Optional[float] = Query(None, ge=0, description="Only tracts with at least this vulnerability"),
+    geocode: bool = Query(False, description="Add each tract's neighbourhood/postcode/city/state under 'geocode'"),
 ):
-    """Return top-n tracts with worst gap scores."""
-    if len(fips) != 5 or not fips.isdigit():
-        raise HTTPException(status_code=400, detail="FIPS must be 5-digit string")
-    if layer not in VALID_LAYERS:
-        raise HTTPException(status_code=400, detail=f"layer must be one of {VALID_LAYERS}")
+    """
+    Return the n tracts with the worst gap scores, after the filters and
+    offset. Each carries its county-wide rank and percentile. Served from the
+    cached ranking, so no geometry or full score table is read.
+    """
+    _check_fips(fips)
+    _check_layer(layer)
+
+    ranking = await _ranking(fips, layer)
+    tracts = page_ranking(ranking, offset, n, min_population, min_vulnerability)
+    if geocode:
+        located = [t for t in tracts if t["centroid_lat"] is not None and t["centroid_lon"] is not None]
+        places = await reverse_geocode_many([(t["centroid_lat"], t["centroid_lon"]) for t in located])
+        for tract, place in zip(located, places):
+            tract["geocode"] = place
+    return tracts
+
+
+@router.get("/{fips}/scores")
+async def gap_scores(
+    fips: str,
+    layer: str = Query("all", description="Layer type: healthcare|food|transit|news|all"),
+    fields: str = Query(",".join(SCORE_FIELDS), description="Comma-separated properties, or 'all'"),
+):
+    """
+    Per-tract scores without geometry, as columns aligned to one geoid array:
+    {"geoid": [...], "layers": {layer: {field: [...]}}}. Pair with
+    /gap/{fips}/geometry so layer switches skip the polygons.
+    """
+    _check_fips(fips)
+    if layer != "all":
+        _check_layer(layer)
+    layers = LAYERS if layer == "all" else (layer,)
+
+    tables = await asyncio.gather(*(_score_table(fips, name) for name in layers))
+    geoids = tables[0]["geoid"]
+    wanted = None if fields == "all" else [f.strip() for f in fields.split(",") if f.strip()]
+    return {
+        "geoid": geoids,
+        "layers": {
+            name: select_columns(table, wanted or [c for c in table if c != "geoid"], geoids)
+            for name, table in zip(layers, tables)
+        },
+    }
+
+
+@router.get("/{fips}/geometry")
+async def gap_geometry(request: Request, fips: str, lod: LevelOfDetail = Depends(_lod_params)):
+    """Tract polygons for a county as a FeatureCollection whose only property is geoid."""
+    _check_fips(fips)
+
+    async def build():
+        geometry = await _geometry(fips, lod)
+        return await run_cpu(assemble_feature_collection, geometry, {"geoid": geometry["geoid"]})
 
-    geojson = await _build_geojson(fips, layer)
-    return get_top_tracts(geojson, n)
+    return await cached_json_response(
+        request,
+        f"gap:response:{fips}:geometry{lod.key}",
+        [_geometry_key(fips, lod)],
+        build,
+        GAP_CACHE_MAX_AGE,
+        refresh=lambda: _geometry(fips, lod),
+    )
@@ -1,20 +1,33 @@
 """Tract-level enrichment endpoints."""
-import httpx
-from fastapi import APIRouter, Query
-from cache.file_cache import cache_get, cache_set
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
+
+from services import geocoding, local_geocoder
+from services.geospatial import fetch_tract_centroids
 
 router = APIRouter(prefix="/tracts")
 
-# Photon (komoot) — OSM-based reverse geocoder, no auth required, no rate-limit issues
-PHOTON_URL = "https://photon.komoot.io/reverse"
-HEADERS = {"User-Agent": "CivicDeserts-Dashboard/1.0 (civic-deserts@example.com)"}
+# Most points or GEOIDs accepted by one batch request
+GEOCODE_BATCH_MAX = int(os.getenv("GEOCODE_BATCH_MAX", "200"))
+
+
+class GeocodeItem(BaseModel):
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    geoid: Optional[str] = None
+
+
+class GeocodeBatch(BaseModel):
+    items: list[GeocodeItem] = Field(..., description="lat/lon pairs or tract GEOIDs")
+
 
-_NULL_RESULT = {
-    "neighbourhood": None,
-    "postcode": None,
-    "city": None,
-    "state": None,
-}
+def warm_up() -> None:
+    """Load the offline geocoder's polygons before the first request."""
+    if geocoding.GEOCODER == "local":
+        local_geocoder.load()
 
 
 @router.get("/geocode")
@@ -23,41 +36,42 @@ async def reverse_geocode(
     lon: float = Query(...),
 ):
     """
-    Reverse geocode a tract centroid via Photon (komoot OSM geocoder).
+    Reverse geocode a tract centroid with the offline polygon index, or via
+    Photon (komoot OSM geocoder) when that is disabled or missing, and for
+    fields (by default city) its polygons do not give.
     Returns neighbourhood/district, postcode, city, state.
-    Cached by coordinates rounded to 2 decimal places (~1km grid).
+    Photon results are cached by coordinates rounded to 2 decimal places (~1km grid).
     On any error, returns null fields so the UI degrades gracefully.
     """
-    cache_key = f"photon:{round(lat, 2)}:{round(lon, 2)}"
-    cached = cache_get(cache_key)
-    if cached is not None:
-        return cached
-
-    try:
-        timeout = httpx.Timeout(connect=5.0, read=20.0, write=5.0, pool=5.0)
-        async with httpx.AsyncClient(timeout=timeout, headers=HEADERS) as client:
-            r = await client.get(PHOTON_URL, params={"lat": lat, "lon": lon})
-            r.raise_for_status()
-    except (httpx.TimeoutException, httpx.HTTPStatusError, httpx.RequestError):
-        return _NULL_RESULT
-
-    data = r.json()
-    features = data.get("features", [])
-    if not features:
-        return _NULL_RESULT
-
-    props = features[0].get("properties", {})
-    # When Photon returns a city/place boundary feature, the city name is in "name"
-    # rather than the "city" field. Use it as fallback.
-    city = (props.get("city") or props.get("town") or props.get("village")
-            or (props.get("name") if props.get("osm_key") == "place" else None)
-            or None)
-    result = {
-        "neighbourhood": props.get("district") or None,
-        "postcode": props.get("postcode") or None,
-        "city": city,
-        "state": props.get("state") or None,
-    }
-
-    cache_set(cache_key, result)
-    return result
+    return await geocoding.reverse_geocode(lat, lon)
+
+
+@router.post("/geocode/batch")
+async def reverse_geocode_batch(batch: GeocodeBatch):
+    """
+    Reverse geocode many points in one request. Each item is {lat, lon} or
+    {geoid} (a tract GEOID, geocoded at its centroid). Returns one result per
+    item, in order, with the coordinates used; unknown GEOIDs get null fields.
+    """
+    if len(batch.items) > GEOCODE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {GEOCODE_BATCH_MAX} items per batch")
+    for item in batch.items:
+        if item.geoid is None and (item.lat is None or item.lon is None):
+            raise HTTPException(status_code=400, detail="Each item needs lat and lon, or geoid")
+
+    centroids = await fetch_tract_centroids([item.geoid for item in batch.items if item.geoid is not None])
+    points: list[Optional[tuple[float, float]]] = [
+        centroids.get(item.geoid) if item.geoid is not None else (item.lat, item.lon)
+        for item in batch.items
+    ]
+    located = [p for p in points if p is not None]
+    resolved = iter(await geocoding.reverse_geocode_many(located))
+
+    results = []
+    for item, point in zip(batch.items, points):
+        result = next(resolved) if point is not None else geocoding.NULL_RESULT
+        entry = {"lat": point[0] if point else None, "lon": point[1] if point else None, **result}
+        if item.geoid is not None:
+            entry = {"geoid": item.geoid, **entry}
+        results.append(entry)
+    return results
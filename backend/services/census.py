@@ -1,10 +1,16 @@
 """ACS 5-year Census API client."""
 import os
-import httpx
-from cache.file_cache import cache_get, cache_set
+import numpy as np
+import pandas as pd
+from cache.file_cache import cache_set_async, cache_set_many_async
+from cache.singleflight import get_or_build, single_flight
+from services.executors import run_cpu
+from services.http import get_client
 
 ACS_YEAR = 2022
 ACS_BASE = f"https://api.census.gov/data/{ACS_YEAR}/acs/acs5"
+# Fetch whole states (in=state:XX county:*) and serve counties from that batch
+ACS_STATE_BATCH = os.getenv("ACS_STATE_BATCH", "1") == "1"
 
 # Poverty: total / in poverty
 # Age 65+: male buckets B01001_020E-025E, female B01001_044E-049E
@@ -20,77 +26,117 @@ ACS_VARS = [
     "B08201_001E", "B08201_002E",           # households total, no vehicle
 ]
 
+AGE_65_VARS = [
+    "B01001_020E", "B01001_021E", "B01001_022E",
+    "B01001_023E", "B01001_024E", "B01001_025E",
+    "B01001_044E", "B01001_045E", "B01001_046E",
+    "B01001_047E", "B01001_048E", "B01001_049E",
+]
+
 
 async def fetch_tract_data(state_fips: str, county_fips: str) -> list[dict]:
     """Return list of tract-level vulnerability metrics."""
     key = f"acs:{state_fips}:{county_fips}:{ACS_YEAR}"
-    cached = cache_get(key)
-    if cached is not None:
-        return cached
+    if ACS_STATE_BATCH:
+        return await get_or_build(key, lambda: _county_from_state_batch(key, state_fips, county_fips))
+    return await get_or_build(key, lambda: _download_tract_data(key, state_fips, county_fips))
+
+
+async def fetch_state_tract_data(state_fips: str) -> dict[str, list[dict]]:
+    """
+    Fetch every tract in a state in one request and fill the per-county
+    acs: cache entries. Returns {county_fips: rows}.
+    """
+    key = f"acs:{state_fips}:*:{ACS_YEAR}"
+    return await single_flight(key, lambda: _download_state_tract_data(state_fips))
+
+
+async def _county_from_state_batch(key: str, state_fips: str, county_fips: str) -> list[dict]:
+    by_county = await fetch_state_tract_data(state_fips)
+    rows = by_county.get(county_fips)
+    if rows is None:
+        # Not in the state response: remember that rather than refetching the state
+        rows = []
+        await cache_set_async(key, rows)
+    return rows
+
+
+async def _download_state_tract_data(state_fips: str) -> dict[str, list[dict]]:
+    raw = await _query_acs(f"state:{state_fips} county:*")
+    rows = await run_cpu(_parse_rows, raw)
+
+    by_county: dict[str, list[dict]] = {}
+    for row in rows:
+        by_county.setdefault(row["county"], []).append(row)
+
+    await cache_set_many_async({
+        f"acs:{state_fips}:{county_fips}:{ACS_YEAR}": county_rows
+        for county_fips, county_rows in by_county.items()
+    })
+    return by_county
 
+
+async def _download_tract_data(key: str, state_fips: str, county_fips: str) -> list[dict]:
+    raw = await _query_acs(f"state:{state_fips} county:{county_fips}")
+    rows = _parse_rows(raw)
+
+    await cache_set_async(key, rows)
+    return rows
+
+
+async def _query_acs(geography: str) -> list[list]:
     api_key = os.getenv("CENSUS_API_KEY", "")
     params = {
         "get": ",".join(ACS_VARS),
         "for": "tract:*",
-        "in": f"state:{state_fips} county:{county_fips}",
+        "in": geography,
     }
     if api_key:
         params["key"] = api_key
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(ACS_BASE, params=params)
-        r.raise_for_status()
+    r = await get_client("census").get(ACS_BASE, params=params)
+    r.raise_for_status()
+    return r.json()
 
-    raw = r.json()
-    headers = raw[0]
-    rows = []
-    for row in raw[1:]:
-        d = dict(zip(headers, row))
-        rows.append(_parse_row(d))
 
-    cache_set(key, rows)
-    return rows
+def _safe_floats(col: pd.Series, default: float = 0.0) -> np.ndarray:
+    """Column-wise float parse; non-numeric and negative (ACS sentinel) values become default."""
+    v = pd.to_numeric(col, errors="coerce").to_numpy(dtype=float)
+    return np.where(v >= 0, v, default)
 
 
-def _safe_float(val, default=0.0) -> float:
-    try:
-        v = float(val)
-        return v if v >= 0 else default
-    except (TypeError, ValueError):
-        return default
-
-
-def _parse_row(d: dict) -> dict:
-    pop = _safe_float(d.get("B01001_001E"), 1)
-    poverty_total = _safe_float(d.get("B17001_001E"), 1)
-    poverty_below = _safe_float(d.get("B17001_002E"))
-    poverty_rate = poverty_below / max(poverty_total, 1)
-
-    age_65_plus = sum(
-        _safe_float(d.get(v))
-        for v in [
-            "B01001_020E", "B01001_021E", "B01001_022E",
-            "B01001_023E", "B01001_024E", "B01001_025E",
-            "B01001_044E", "B01001_045E", "B01001_046E",
-            "B01001_047E", "B01001_048E", "B01001_049E",
-        ]
-    )
-    age_vulnerability = age_65_plus / max(pop, 1)
-
-    hh_total = _safe_float(d.get("B08201_001E"), 1)
-    hh_no_vehicle = _safe_float(d.get("B08201_002E"))
-    no_vehicle_rate = hh_no_vehicle / max(hh_total, 1)
-
-    tract_id = d.get("tract", "")
-    return {
-        "tract": tract_id,
-        "state": d.get("state", ""),
-        "county": d.get("county", ""),
-        "geoid": d.get("state", "") + d.get("county", "") + tract_id,
-        "name": d.get("NAME", ""),
-        "population": int(pop),
-        "poverty_rate": round(poverty_rate, 4),
-        "age_vulnerability": round(age_vulnerability, 4),
-        "no_vehicle_rate": round(no_vehicle_rate, 4),
-        "vulnerability": round(poverty_rate + age_vulnerability + no_vehicle_rate, 4),
-    }
+def _parse_rows(raw: list[list]) -> list[dict]:
+    """Parse a Census API response (header row + data rows) in one vectorized pass."""
+    if len(raw) < 2:
+        return []
+    df = pd.DataFrame(raw[1:], columns=raw[0])
+    col = lambda name: df[name] if name in df.columns else pd.Series([None] * len(df), dtype=object)
+    text = lambda name: col(name).fillna("").astype(str).to_numpy(dtype=object)
+
+    pop = _safe_floats(col("B01001_001E"), 1)
+    poverty_total = _safe_floats(col("B17001_001E"), 1)
+    poverty_below = _safe_floats(col("B17001_002E"))
+    poverty_rate = poverty_below / np.maximum(poverty_total, 1)
+
+    age_65_plus = sum(_safe_floats(col(v)) for v in AGE_65_VARS)
+    age_vulnerability = age_65_plus / np.maximum(pop, 1)
+
+    hh_total = _safe_floats(col("B08201_001E"), 1)
+    hh_no_vehicle = _safe_floats(col("B08201_002E"))
+    no_vehicle_rate = hh_no_vehicle / np.maximum(hh_total, 1)
+
+    state, county, tract = text("state"), text("county"), text("tract")
+    parsed = pd.DataFrame({
+        "tract": tract,
+        "state": state,
+        "county": county,
+        "geoid": state + county + tract,
+        "name": text("NAME"),
+        "population": pop.astype(np.int64),
+        # Python's round(), as the per-row parser did; np.round can differ in the last digit
+        "poverty_rate": [round(v, 4) for v in poverty_rate.tolist()],
+        "age_vulnerability": [round(v, 4) for v in age_vulnerability.tolist()],
+        "no_vehicle_rate": [round(v, 4) for v in no_vehicle_rate.tolist()],
+        "vulnerability": [round(v, 4) for v in (poverty_rate + age_vulnerability + no_vehicle_rate).tolist()],
+    })
+    return parsed.to_dict("records")
@@ -0,0 +1,172 @@
+"""
+In-memory county name index for typeahead search.
+
+Choices are normalized once with rapidfuzz's default_process. A query is
+narrowed to a candidate set by word prefix and character trigram postings
+before WRatio scoring, so each keystroke scores a few hundred strings
+instead of every county. A trailing state code or name ("cook il",
+"king washington") restricts the search to that state's county names. Recent queries are answered from an LRU.
+"""
+import os
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+# Candidates passed to the fuzzy scorer, by trigram overlap
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "300"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "4096"))
+
+# No "co": users type it for "county" ("king co"), so it must not mean Colorado
+STATE_ABBREVIATIONS = {
+    "al": "alabama", "ak": "alaska", "az": "arizona", "ar": "arkansas", "ca": "california",
+    "ct": "connecticut", "de": "delaware", "dc": "district of columbia",
+    "fl": "florida", "ga": "georgia", "hi": "hawaii", "id": "idaho", "il": "illinois",
+    "in": "indiana", "ia": "iowa", "ks": "kansas", "ky": "kentucky", "la": "louisiana",
+    "me": "maine", "md": "maryland", "ma": "massachusetts", "mi": "michigan", "mn": "minnesota",
+    "ms": "mississippi", "mo": "missouri", "mt": "montana", "ne": "nebraska", "nv": "nevada",
+    "nh": "new hampshire", "nj": "new jersey", "nm": "new mexico", "ny": "new york",
+    "nc": "north carolina", "nd": "north dakota", "oh": "ohio", "ok": "oklahoma", "or": "oregon",
+    "pa": "pennsylvania", "pr": "puerto rico", "ri": "rhode island", "sc": "south carolina",
+    "sd": "south dakota", "tn": "tennessee", "tx": "texas", "ut": "utah", "vt": "vermont",
+    "va": "virginia", "wa": "washington", "wv": "west virginia", "wi": "wisconsin", "wy": "wyoming",
+}
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Full state names as word lists, longest first so "west virginia" wins over "virginia"
+_STATE_WORDS = sorted(
+    (name.split() for name in {*STATE_ABBREVIATIONS.values(), "colorado"}), key=len, reverse=True
+)
+
+
+def split_state_alias(query: str) -> tuple[str, Optional[str]]:
+    """
+    'cook il' → ('cook', 'illinois'), 'king washington' → ('king', 'washington'):
+    a trailing state code or full state name, with words before it, names a state.
+    """
+    words = query.split()
+    if len(words) > 1 and words[-1] in STATE_ABBREVIATIONS:
+        return " ".join(words[:-1]), STATE_ABBREVIATIONS[words[-1]]
+    for state in _STATE_WORDS:
+        if len(words) > len(state) and words[-len(state):] == state:
+            return " ".join(words[:-len(state)]), " ".join(state)
+    return query, None
+
+
+class CountyIndex:
+    """Normalized county choices with word-prefix and trigram postings."""
+
+    def __init__(self, counties: list[dict]):
+        self.counties = counties
+        self.results = [
+            {"fips": c["fips"], "name": c["name"], "state": c["state"], "full": c["full"]}
+            for c in counties
+        ]
+        self.choices = [default_process(f"{c['name']}, {c['state']}") for c in counties]
+        self.names = [default_process(c["name"]) for c in counties]
+        self.by_state: dict[str, list[int]] = {}
+        for idx, c in enumerate(counties):
+            self.by_state.setdefault(default_process(c["state"]), []).append(idx)
+
+        postings: dict[str, list[int]] = {}
+        words: set[tuple[str, int]] = set()
+        for idx, choice in enumerate(self.choices):
+            for gram in _trigrams(choice):
+                postings.setdefault(gram, []).append(idx)
+            words.update((word, idx) for word in choice.split())
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._words = sorted(words)
+
+    def _prefix_matches(self, prefix: str) -> set[int]:
+        matches = set()
+        i = bisect_left(self._words, (prefix, -1))
+        while i < len(self._words) and self._words[i][0].startswith(prefix):
+            matches.add(self._words[i][1])
+            i += 1
+        return matches
+
+    def candidates(self, query: str, limit: int = 10) -> list[int]:
+        """
+        Indices worth scoring, in index order (so score ties keep the file's
+        order). Falls back to every county when the filter finds too few.
+        """
+        candidates = self._prefix_matches(query.split()[0]) if query else set()
+        hits = [self._postings[g] for g in _trigrams(query) if g in self._postings]
+        if hits:
+            counts = np.bincount(np.concatenate(hits), minlength=len(self.choices))
+            top = np.argsort(-counts, kind="stable")[:SEARCH_CANDIDATES]
+            candidates.update(int(i) for i in top if counts[i] > 0)
+        if len(candidates) < limit:
+            return list(range(len(self.choices)))
+        return sorted(candidates)
+
+    @staticmethod
+    def _extract(query: str, ids: list[int], choices: list[str], limit: int, score_cutoff: float) -> list[int]:
+        matches = process.extract(
+            query,
+            [choices[i] for i in ids],
+            scorer=fuzz.WRatio,
+            processor=None,
+            limit=None,
+            score_cutoff=score_cutoff,
+        )
+        if len(matches) > limit:
+            # Keep every match tied with the last slot: WRatio caps partial
+            # matches, so "st louis" ties every "st ... county" at one score
+            floor = matches[limit - 1][1]
+            matches = [m for m in matches if m[1] >= floor]
+        # token_set_ratio breaks those ties toward the whole-word match
+        matches.sort(key=lambda m: (-m[1], -fuzz.token_set_ratio(query, m[0], processor=None)))
+        return [ids[pos] for _choice, _score, pos in matches[:limit]]
+
+    def search(self, query: str, state: Optional[str] = None, limit: int = 10, score_cutoff: float = 50) -> list[int]:
+        """
+        Indices of the best WRatio matches for an already-normalized query,
+        against county names within state when one is given and matches.
+        """
+        if state in self.by_state:
+            found = self._extract(query, self.by_state[state], self.names, limit, score_cutoff)
+            if found:
+                return found
+        ids = self.candidates(query, limit)
+        return self._extract(query, ids, self.choices, limit, score_cutoff)
+
+
+_index: Optional[CountyIndex] = None
+
+
+def is_built() -> bool:
+    return _index is not None
+
+
+def build_index(counties: list[dict]) -> CountyIndex:
+    """Build the process-wide index and clear cached query results."""
+    global _index
+    _index = CountyIndex(counties)
+    _cached_search.cache_clear()
+    return _index
+
+
+@lru_cache(maxsize=SEARCH_CACHE_SIZE)
+def _cached_search(query: str) -> tuple[int, ...]:
+    name, state = split_state_alias(query)
+    found = _index.search(name, state)
+    if not found and state is not None:
+        found = _index.search(query)
+    return tuple(found)
+
+
+def search(query: str) -> list[dict]:
+    """Top county matches for a raw user query, as {fips, name, state, full} dicts."""
+    normalized = default_process(query)
+    if not normalized:
+        return []
+    return [_index.results[i] for i in _cached_search(normalized)]
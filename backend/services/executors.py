@@ -0,0 +1,71 @@
+"""Worker pools that keep CPU-bound scoring and geometry work off the event loop."""
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# "thread" (default; Shapely 2 and NumPy release the GIL for most of the work)
+# or "process" (full isolation, at the cost of pickling frames to workers)
+SCORING_EXECUTOR = os.getenv("SCORING_EXECUTOR", "thread")
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jobs allowed to wait for a worker before new ones are rejected
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "16"))
+
+_pool: Optional[Executor] = None
+_slots: Optional[asyncio.Semaphore] = None
+_pending = 0
+
+
+class Overloaded(Exception):
+    """Raised when too many CPU jobs are already running or queued."""
+
+
+def _get_pool() -> Executor:
+    global _pool
+    if _pool is None:
+        if SCORING_EXECUTOR == "process":
+            _pool = ProcessPoolExecutor(max_workers=SCORING_WORKERS)
+        else:
+            _pool = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix="scoring")
+    return _pool
+
+
+async def run_cpu(fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run fn(*args, **kwargs) on the scoring pool.
+    At most SCORING_WORKERS jobs run at once and MAX_QUEUED_JOBS wait;
+    beyond that Overloaded is raised so callers can shed load.
+    """
+    global _pending, _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(SCORING_WORKERS)
+    if _pending >= SCORING_WORKERS + MAX_QUEUED_JOBS:
+        raise Overloaded(f"{_pending} scoring jobs in progress")
+
+    _pending += 1
+    try:
+        async with _slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_get_pool(), partial(fn, *args, **kwargs))
+    finally:
+        _pending -= 1
+
+
+def executor_stats() -> dict:
+    return {
+        "executor": SCORING_EXECUTOR,
+        "workers": SCORING_WORKERS,
+        "pending": _pending,
+        "max_queued": MAX_QUEUED_JOBS,
+    }
+
+
+def shutdown_executors() -> None:
+    global _pool, _slots
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+    _slots = None
@@ -1,9 +1,12 @@
 """Compute gap scores by joining Census tracts with OSM POIs."""
 import math
+from typing import Optional
+
 import geopandas as gpd
+import numpy as np
 import pandas as pd
-from shapely.geometry import Point, MultiPoint
-from shapely.ops import nearest_points
+import shapely
+from shapely import STRtree
 
 
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -15,6 +18,171 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
+def haversine_km_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorized haversine_km over NumPy arrays (degrees in, km out)."""
+    R = 6371.0
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(np.asarray(lat2) - np.asarray(lat1))
+    dlambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def nearest_poi_km(lons: np.ndarray, lats: np.ndarray, pois: list[dict]) -> np.ndarray:
+    """
+    Distance (km) from each (lon, lat) point to its nearest POI.
+    The STRtree is built once per POI set and all points are queried in one call.
+    Nearest is planar in lon/lat degrees (same as shapely.ops.nearest_points);
+    the reported distance is haversine to that POI. Returns 999.0 when there are no POIs.
+    """
+    if not pois:
+        return np.full(len(lons), 999.0)
+
+    poi_lon = np.array([p["lon"] for p in pois], dtype=float)
+    poi_lat = np.array([p["lat"] for p in pois], dtype=float)
+    tree = STRtree(shapely.points(poi_lon, poi_lat))
+
+    # query_nearest returns (input_idx, tree_idx) pairs; keep one match per input
+    input_idx, tree_idx = tree.query_nearest(shapely.points(lons, lats), all_matches=False)
+    nearest = np.empty(len(lons), dtype=np.intp)
+    nearest[input_idx] = tree_idx
+    return haversine_km_array(lats, lons, poi_lat[nearest], poi_lon[nearest])
+
+
+# Census columns carried into every feature; missing tracts default to 0.0
+VULN_COLUMNS = ["vulnerability", "poverty_rate", "age_vulnerability", "no_vehicle_rate"]
+
+GAP_PROPERTIES = [
+    "geoid", "name", "gap_score", *VULN_COLUMNS, "dist_km", "centroid_lat", "centroid_lon",
+]
+NEWS_PROPERTIES = [
+    "geoid", "name", "gap_score", *VULN_COLUMNS, "dist_km",
+    "outlet_density", "outlet_count", "centroid_lat", "centroid_lon",
+]
+# Default columns of the geometry-free scores endpoint
+SCORE_FIELDS = ["gap_score", "vulnerability", "dist_km"]
+
+
+def _geoids(tract_gdf: gpd.GeoDataFrame) -> np.ndarray:
+    geoid_col = "GEOID" if "GEOID" in tract_gdf.columns else "geoid"
+    if geoid_col in tract_gdf.columns:
+        return tract_gdf[geoid_col].astype(str).to_numpy()
+    return np.full(len(tract_gdf), "", dtype=object)
+
+
+def _scored_frame(tract_gdf: gpd.GeoDataFrame, census_rows: list[dict]) -> pd.DataFrame:
+    """
+    Join census rows onto tracts with a single merge on GEOID.
+    Returns one row per tract with geoid, name, VULN_COLUMNS and centroid lon/lat.
+    """
+    geoids = _geoids(tract_gdf)
+
+    if "centroid_lon" in tract_gdf.columns:
+        # Precomputed by cache.geo_store
+        lons, lats = tract_gdf["centroid_lon"].to_numpy(), tract_gdf["centroid_lat"].to_numpy()
+    else:
+        centroids = shapely.centroid(tract_gdf.geometry.values)
+        lons, lats = shapely.get_x(centroids), shapely.get_y(centroids)
+    frame = pd.DataFrame({
+        "geoid": geoids,
+        "tract_name": tract_gdf["NAME"].to_numpy() if "NAME" in tract_gdf.columns else geoids,
+        "centroid_lon": lons,
+        "centroid_lat": lats,
+    })
+
+    census = pd.DataFrame(census_rows, columns=["geoid", "name", *VULN_COLUMNS])
+    # Last row wins on duplicate GEOIDs, matching the previous dict lookup
+    census = census.drop_duplicates("geoid", keep="last")
+    frame = frame.merge(census, on="geoid", how="left", indicator=True)
+
+    matched = (frame["_merge"] == "both").to_numpy()
+    frame["name"] = np.where(matched, frame["name"], frame["tract_name"])
+    frame[VULN_COLUMNS] = frame[VULN_COLUMNS].astype(float).fillna(0.0)
+    return frame.drop(columns=["tract_name", "_merge"])
+
+
+def _rounded(values, ndigits: int) -> list[float]:
+    """Python's round() per value; np.round scales by 10**ndigits and can differ in the last digit."""
+    return [round(v, ndigits) for v in np.asarray(values, dtype=float).tolist()]
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Half a 256px web-map pixel at this zoom, in degrees of longitude."""
+    return 180.0 / (256 * 2 ** zoom)
+
+
+def tolerance_zoom(tolerance: float) -> int:
+    """Lowest zoom (0-22) whose zoom_tolerance() is no coarser than `tolerance` degrees."""
+    return min(22, max(0, math.ceil(math.log2(180.0 / (256 * tolerance)))))
+
+
+def zoom_precision(zoom: int) -> int:
+    """Decimal places whose grid is no coarser than zoom_tolerance(zoom)."""
+    return min(9, max(0, math.ceil(-math.log10(zoom_tolerance(zoom)))))
+
+
+def simplify_geometries(geoms: np.ndarray, tolerance: float = 0.0, precision: Optional[int] = None) -> np.ndarray:
+    """
+    Topology-preserving simplification (each polygon stays valid) followed by
+    snapping to a 10**-precision grid. Polygons that would collapse on the
+    grid keep their simplified, unsnapped shape.
+    """
+    if tolerance > 0:
+        geoms = shapely.simplify(geoms, tolerance, preserve_topology=True)
+    if precision is not None:
+        snapped = shapely.set_precision(geoms, 10.0 ** -precision)
+        snapped = np.where(shapely.is_empty(snapped), geoms, snapped)
+        # Round away binary noise (0.30000000000000004) so JSON stays short
+        geoms = shapely.transform(snapped, lambda coords: np.round(coords, precision))
+    return geoms
+
+
+def geometry_record(tract_gdf: gpd.GeoDataFrame, tolerance: float = 0.0, precision: Optional[int] = None) -> dict:
+    """
+    Geometry shared by every layer of a county: {"geoid": [...], "geometry": [GeoJSON geometry, ...]},
+    optionally simplified to tolerance (degrees) and quantized to precision decimal places.
+    """
+    geoms = simplify_geometries(tract_gdf.geometry.values.to_numpy(), tolerance, precision)
+    return {
+        "geoid": _geoids(tract_gdf).tolist(),
+        "geometry": [g.__geo_interface__ for g in geoms],
+    }
+
+
+def assemble_feature_collection(geometry: dict, table: dict) -> dict:
+    """Join a geometry record and a score table on geoid into a GeoJSON FeatureCollection."""
+    geom_by_geoid = dict(zip(geometry["geoid"], geometry["geometry"]))
+    properties = list(table)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": geom_by_geoid.get(props["geoid"]),
+            "properties": props,
+        }
+        for props in (dict(zip(properties, values)) for values in zip(*table.values()))
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def select_columns(table: dict, fields: list[str], geoids: Optional[list[str]] = None) -> dict:
+    """
+    Subset of a score table's columns. With geoids, rows are reordered to
+    match that list, and tracts missing from the table become None.
+    """
+    columns = {f: table[f] for f in fields if f in table}
+    if geoids is None or geoids == table["geoid"]:
+        return columns
+    index = {g: i for i, g in enumerate(table["geoid"])}
+    positions = [index.get(g) for g in geoids]
+    return {f: [values[i] if i is not None else None for i in positions] for f, values in columns.items()}
+
+
+def table_rows(table: dict) -> list[dict]:
+    """Score table (dict of columns) → list of per-tract property dicts."""
+    properties = list(table)
+    return [dict(zip(properties, values)) for values in zip(*table.values())]
+
+
 def compute_gap_scores(
     tract_gdf: gpd.GeoDataFrame,
     census_rows: list[dict],
@@ -24,80 +192,34 @@ def compute_gap_scores(
     Join vulnerability data + nearest POI distance → gap scores.
     Returns GeoJSON FeatureCollection with gap_score property.
     """
-    # Build vulnerability lookup keyed by GEOID
-    vuln_lookup: dict[str, dict] = {row["geoid"]: row for row in census_rows}
+    table = compute_gap_table(tract_gdf, census_rows, pois)
+    return assemble_feature_collection(geometry_record(tract_gdf), table)
 
-    # Build POI MultiPoint for nearest_points search (lon, lat order for Shapely)
-    if pois:
-        poi_points = MultiPoint([(p["lon"], p["lat"]) for p in pois])
-    else:
-        poi_points = None
-
-    # Compute centroids in EPSG:4326
-    tract_gdf = tract_gdf.copy()
-    tract_gdf = tract_gdf.set_crs("EPSG:4326", allow_override=True)
-
-    results = []
-    for _, row in tract_gdf.iterrows():
-        geoid = str(row.get("GEOID", row.get("geoid", "")))
-        vuln = vuln_lookup.get(geoid, {})
-        vulnerability = vuln.get("vulnerability", 0.0)
-
-        centroid = row.geometry.centroid
-        cx, cy = centroid.x, centroid.y  # lon, lat
-
-        if poi_points is not None:
-            # nearest_points(g1, g2) → (pt_on_g1, pt_on_g2); we want the POI side (g2)
-            _, nearest_poi = nearest_points(Point(cx, cy), poi_points)
-            dist_km = haversine_km(cy, cx, nearest_poi.y, nearest_poi.x)
-        else:
-            dist_km = 999.0
-
-        gap_score_raw = vulnerability / max(dist_km, 0.1)
-
-        results.append({
-            "geoid": geoid,
-            "geometry": row.geometry,
-            "vulnerability": vulnerability,
-            "poverty_rate": vuln.get("poverty_rate", 0.0),
-            "age_vulnerability": vuln.get("age_vulnerability", 0.0),
-            "no_vehicle_rate": vuln.get("no_vehicle_rate", 0.0),
-            "dist_km": round(dist_km, 3),
-            "gap_score_raw": gap_score_raw,
-            "name": vuln.get("name", row.get("NAME", geoid)),
-            "centroid_lat": round(cy, 5),
-            "centroid_lon": round(cx, 5),
-        })
-
-    if not results:
-        return {"type": "FeatureCollection", "features": []}
+
+def compute_gap_table(
+    tract_gdf: gpd.GeoDataFrame,
+    census_rows: list[dict],
+    pois: list[dict],
+) -> dict:
+    """compute_gap_scores without geometry: {property: [value per tract]}."""
+    frame = _scored_frame(tract_gdf, census_rows)
+
+    # Nearest POI distance for every centroid in one batched query
+    dist_km = nearest_poi_km(frame["centroid_lon"].to_numpy(), frame["centroid_lat"].to_numpy(), pois)
+    gap_score_raw = frame["vulnerability"].to_numpy() / np.maximum(dist_km, 0.1)
 
     # Normalize gap scores 0–100 within county
-    scores = [r["gap_score_raw"] for r in results]
-    min_s, max_s = min(scores), max(scores)
-    score_range = max_s - min_s if max_s > min_s else 1.0
-
-    features = []
-    for r in results:
-        norm = round((r["gap_score_raw"] - min_s) / score_range * 100, 2)
-        features.append({
-            "type": "Feature",
-            "geometry": r["geometry"].__geo_interface__,
-            "properties": {
-                "geoid": r["geoid"],
-                "name": r["name"],
-                "gap_score": norm,
-                "vulnerability": r["vulnerability"],
-                "poverty_rate": r["poverty_rate"],
-                "age_vulnerability": r["age_vulnerability"],
-                "no_vehicle_rate": r["no_vehicle_rate"],
-                "dist_km": r["dist_km"],
-                "centroid_lat": r["centroid_lat"],
-                "centroid_lon": r["centroid_lon"],
-            },
-        })
+    if len(frame):
+        min_s, max_s = gap_score_raw.min(), gap_score_raw.max()
+        score_range = max_s - min_s if max_s > min_s else 1.0
+        frame["gap_score"] = _rounded((gap_score_raw - min_s) / score_range * 100, 2)
+    else:
+        frame["gap_score"] = gap_score_raw
 
-    return {"type": "FeatureCollection", "features": features}
+    frame["dist_km"] = _rounded(dist_km, 3)
+    frame["centroid_lat"] = _rounded(frame["centroid_lat"], 5)
+    frame["centroid_lon"] = _rounded(frame["centroid_lon"], 5)
+    return {c: frame[c].tolist() for c in GAP_PROPERTIES}
 
 
 def compute_news_gap_scores(
@@ -112,65 +234,67 @@ def compute_news_gap_scores(
     Normalized globally (0–100) using theoretical max of 3.0 / 0.1 = 30.
     This preserves cross-county signal: news deserts stay dark even after normalization.
     """
-    import geopandas as gpd
+    table = compute_news_gap_table(tract_gdf, census_rows, outlet_density, outlet_count)
+    return assemble_feature_collection(geometry_record(tract_gdf), table)
 
-    vuln_lookup: dict[str, dict] = {row["geoid"]: row for row in census_rows}
 
+def compute_news_gap_table(
+    tract_gdf,
+    census_rows: list[dict],
+    outlet_density: float,
+    outlet_count: int,
+) -> dict:
+    """compute_news_gap_scores without geometry: {property: [value per tract]}."""
     GLOBAL_MAX = 30.0  # vulnerability(3) / floor(0.1)
 
-    features = []
-    for _, row in tract_gdf.iterrows():
-        geoid = str(row.get("GEOID", row.get("geoid", "")))
-        vuln = vuln_lookup.get(geoid, {})
-        vulnerability = vuln.get("vulnerability", 0.0)
+    frame = _scored_frame(tract_gdf, census_rows)
 
-        gap_raw = vulnerability / max(outlet_density, 0.1)
-        gap_score = round(min(gap_raw / GLOBAL_MAX * 100, 100), 2)
+    gap_raw = frame["vulnerability"].to_numpy() / max(outlet_density, 0.1)
+    frame["gap_score"] = _rounded(np.minimum(gap_raw / GLOBAL_MAX * 100, 100), 2)
+    frame["dist_km"] = 0.0
+    frame["outlet_density"] = outlet_density
+    frame["outlet_count"] = outlet_count
+    frame["centroid_lat"] = _rounded(frame["centroid_lat"], 5)
+    frame["centroid_lon"] = _rounded(frame["centroid_lon"], 5)
+    return {c: frame[c].tolist() for c in NEWS_PROPERTIES}
 
-        centroid = row.geometry.centroid
-        features.append({
-            "type": "Feature",
-            "geometry": row.geometry.__geo_interface__,
-            "properties": {
-                "geoid": geoid,
-                "name": vuln.get("name", row.get("NAME", geoid)),
-                "gap_score": gap_score,
-                "vulnerability": vulnerability,
-                "poverty_rate": vuln.get("poverty_rate", 0.0),
-                "age_vulnerability": vuln.get("age_vulnerability", 0.0),
-                "no_vehicle_rate": vuln.get("no_vehicle_rate", 0.0),
-                "dist_km": 0.0,
-                "outlet_density": outlet_density,
-                "outlet_count": outlet_count,
-                "centroid_lat": round(centroid.y, 5),
-                "centroid_lon": round(centroid.x, 5),
-            },
-        })
 
-    return {"type": "FeatureCollection", "features": features}
+def build_ranking(table: dict, census_rows: list[dict]) -> dict:
+    """
+    Geometry-free ranking of a score table: its GAP_PROPERTIES or
+    NEWS_PROPERTIES columns sorted by gap_score descending (ties keep table
+    order), plus population from the ACS rows, 1-based rank and percentile
+    (share of the county's tracts scoring at or below the tract, 0–100).
+    """
+    scores = np.asarray(table["gap_score"], dtype=float)
+    order = np.argsort(-scores, kind="stable")
+    at_or_below = np.searchsorted(np.sort(scores), scores, side="right")
+    percentile = np.round(at_or_below / max(len(scores), 1) * 100, 1)
 
+    population_by_geoid = {str(r.get("geoid")): int(r.get("population") or 0) for r in census_rows}
+    population = [population_by_geoid.get(g, 0) for g in table["geoid"]]
 
-def get_top_tracts(geojson: dict, n: int = 5) -> list[dict]:
-    """Return top-n tracts sorted by gap_score descending."""
-    features = geojson.get("features", [])
-    ranked = sorted(features, key=lambda f: f["properties"]["gap_score"], reverse=True)
-    results = []
-    for f in ranked[:n]:
-        p = f["properties"]
-        entry = {
-            "geoid": p["geoid"],
-            "name": p["name"],
-            "gap_score": p["gap_score"],
-            "vulnerability": p["vulnerability"],
-            "poverty_rate": p["poverty_rate"],
-            "age_vulnerability": p["age_vulnerability"],
-            "no_vehicle_rate": p["no_vehicle_rate"],
-            "dist_km": p["dist_km"],
-            "centroid_lat": p.get("centroid_lat"),
-            "centroid_lon": p.get("centroid_lon"),
-        }
-        if "outlet_density" in p:
-            entry["outlet_density"] = p["outlet_density"]
-            entry["outlet_count"] = p["outlet_count"]
-        results.append(entry)
-    return results
+    ranking = {f: [values[i] for i in order] for f, values in table.items()}
+    ranking["population"] = [population[i] for i in order]
+    ranking["rank"] = list(range(1, len(order) + 1))
+    ranking["percentile"] = percentile[order].tolist()
+    return ranking
+
+
+def page_ranking(
+    ranking: dict,
+    offset: int = 0,
+    limit: int = 5,
+    min_population: int = 0,
+    min_vulnerability: Optional[float] = None,
+) -> list[dict]:
+    """Rows offset..offset+limit of a ranking after filtering, as top-tracts entries."""
+    population = ranking["population"]
+    vulnerability = ranking["vulnerability"]
+    rows = [
+        i for i in range(len(population))
+        if population[i] >= min_population
+        and (min_vulnerability is None or vulnerability[i] >= min_vulnerability)
+    ]
+    fields = list(ranking)
+    return [{f: ranking[f][i] for f in fields} for i in rows[offset:offset + limit]]
@@ -0,0 +1,130 @@
+"""Reverse geocoding: offline polygons first, Photon (cached per ~1km cell) for what they miss."""
+import asyncio
+import os
+
+import httpx
+from cache.file_cache import cache_lookup_many_async, cache_set_async
+from cache.singleflight import get_or_build, run_in_background, single_flight
+from services import local_geocoder
+from services.http import get_client
+
+# Photon (komoot) — OSM-based reverse geocoder, no auth required, no rate-limit issues
+PHOTON_URL = "https://photon.komoot.io/reverse"
+
+# "local": offline polygons (python -m services.local_geocoder), asking Photon
+# when GEOCODER_FALLBACK=photon and they match nothing or leave one of
+# GEOCODER_FALLBACK_FIELDS empty; "photon": always Photon
+GEOCODER = os.getenv("GEOCODER", "local")
+GEOCODER_FALLBACK = os.getenv("GEOCODER_FALLBACK", "photon")
+# With a partial import (e.g. states or ZCTAs only) every point matches
+# something, so these fields are filled from Photon when no polygon gives them
+GEOCODER_FALLBACK_FIELDS = [f for f in os.getenv("GEOCODER_FALLBACK_FIELDS", "city").split(",") if f]
+# Photon requests in flight at once for one batch
+PHOTON_BATCH_CONCURRENCY = int(os.getenv("PHOTON_BATCH_CONCURRENCY", "4"))
+
+NULL_RESULT = {
+    "neighbourhood": None,
+    "postcode": None,
+    "city": None,
+    "state": None,
+}
+
+
+def _use_local() -> bool:
+    return GEOCODER == "local" and local_geocoder.available()
+
+
+def _needs_fallback(result: dict) -> bool:
+    if GEOCODER_FALLBACK != "photon":
+        return False
+    return not any(result.values()) or any(result.get(f) is None for f in GEOCODER_FALLBACK_FIELDS)
+
+
+def _fill_missing(result: dict, fallback: dict) -> dict:
+    """result with its None fields taken from fallback; matched polygons win."""
+    return {field: value if value is not None else fallback.get(field) for field, value in result.items()}
+
+
+def _photon_key(lat: float, lon: float) -> str:
+    return f"photon:{round(lat, 2)}:{round(lon, 2)}"
+
+
+async def reverse_geocode(lat: float, lon: float) -> dict:
+    """neighbourhood/postcode/city/state for one point; null fields on failure."""
+    result = NULL_RESULT
+    if _use_local():
+        result = local_geocoder.reverse(lat, lon)
+        if not _needs_fallback(result):
+            return result
+
+    cache_key = _photon_key(lat, lon)
+    return _fill_missing(result, await get_or_build(cache_key, lambda: _photon_reverse(cache_key, lat, lon)))
+
+
+async def reverse_geocode_many(points: list[tuple[float, float]]) -> list[dict]:
+    """
+    reverse_geocode for many (lat, lon) points. Points sharing a Photon cache
+    cell are resolved once, cache hits are read in one bulk lookup, and misses
+    go to Photon with at most PHOTON_BATCH_CONCURRENCY requests in flight.
+    """
+    results: list[dict] = [NULL_RESULT] * len(points)
+    pending = list(range(len(points)))
+    if _use_local() and points:
+        results = local_geocoder.reverse_many([p[0] for p in points], [p[1] for p in points])
+        pending = [i for i, r in enumerate(results) if _needs_fallback(r)]
+    if not pending:
+        return results
+
+    # One representative point per cache cell
+    cells: dict[str, tuple[float, float]] = {}
+    for i in pending:
+        cells.setdefault(_photon_key(*points[i]), points[i])
+
+    found = await cache_lookup_many_async(list(cells))
+    by_cell = {}
+    for key, (data, fresh) in found.items():
+        by_cell[key] = data
+        if not fresh:
+            lat, lon = cells[key]
+            run_in_background(key, lambda key=key, lat=lat, lon=lon: _photon_reverse(key, lat, lon))
+
+    slots = asyncio.Semaphore(PHOTON_BATCH_CONCURRENCY)
+
+    async def resolve(key: str, lat: float, lon: float) -> None:
+        async with slots:
+            by_cell[key] = await single_flight(key, lambda: _photon_reverse(key, lat, lon))
+
+    await asyncio.gather(*(resolve(key, *cells[key]) for key in cells if key not in by_cell))
+    for i in pending:
+        results[i] = _fill_missing(results[i], by_cell[_photon_key(*points[i])])
+    return results
+
+
+async def _photon_reverse(cache_key: str, lat: float, lon: float) -> dict:
+    """Query Photon and cache the result; failures return NULL_RESULT uncached."""
+    try:
+        r = await get_client("photon").get(PHOTON_URL, params={"lat": lat, "lon": lon})
+        r.raise_for_status()
+    except (httpx.TimeoutException, httpx.HTTPStatusError, httpx.RequestError):
+        return NULL_RESULT
+
+    data = r.json()
+    features = data.get("features", [])
+    if not features:
+        return NULL_RESULT
+
+    props = features[0].get("properties", {})
+    # When Photon returns a city/place boundary feature, the city name is in "name"
+    # rather than the "city" field. Use it as fallback.
+    city = (props.get("city") or props.get("town") or props.get("village")
+            or (props.get("name") if props.get("osm_key") == "place" else None)
+            or None)
+    result = {
+        "neighbourhood": props.get("district") or None,
+        "postcode": props.get("postcode") or None,
+        "city": city,
+        "state": props.get("state") or None,
+    }
+
+    await cache_set_async(cache_key, result)
+    return result
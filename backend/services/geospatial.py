@@ -1,70 +1,256 @@
 """Fetch Census TIGER tract boundaries and compute centroids."""
-import httpx
+import asyncio
+import logging
+import math
+import os
 import geopandas as gpd
 from io import BytesIO
-from cache.file_cache import cache_get, cache_set
+from typing import Optional
+from cache.file_cache import cache_set_async, cache_set_many_async, cache_versions_async
+from cache.geo_store import lookup_tracts_async, with_derived_columns, write_tracts_async
+from cache.singleflight import get_or_build
+from services.executors import run_cpu
+from services.http import get_client
 
 TIGER_BASE = "https://tigerweb.geo.census.gov/arcgis/rest/services/TIGERweb/tigerWMS_Census2020/MapServer"
 # Layer 6 = Census Tracts, Layer 8 = Census Block Groups (wrong)
 TRACT_LAYER = 6
+# County layer = 82 (84 = Zip Code Tabulation Areas)
+COUNTY_LAYER = 82
+
+# Tract queries are paged so large counties are never cut off at the
+# server's maxRecordCount; pages are fetched concurrently.
+TIGER_PAGE_SIZE = int(os.getenv("TIGER_PAGE_SIZE", "1000"))
+TIGER_PAGE_CONCURRENCY = int(os.getenv("TIGER_PAGE_CONCURRENCY", "4"))
+# Server-side generalization tolerance in degrees (0 = full resolution)
+# and decimal places kept per coordinate (0 = server default)
+TIGER_MAX_ALLOWABLE_OFFSET = float(os.getenv("TIGER_MAX_ALLOWABLE_OFFSET", "0"))
+TIGER_GEOMETRY_PRECISION = int(os.getenv("TIGER_GEOMETRY_PRECISION", "6"))
+# Counties whose tracts are loaded at once for GEOID → centroid lookups
+TRACT_CENTROID_CONCURRENCY = int(os.getenv("TRACT_CENTROID_CONCURRENCY", "4"))
+
+logger = logging.getLogger(__name__)
+
+_centroid_slots: Optional[asyncio.Semaphore] = None
 
 
 async def fetch_tract_boundaries(state_fips: str, county_fips: str) -> gpd.GeoDataFrame:
-    """Return GeoDataFrame with tract polygons + GEOID."""
+    """
+    Return GeoDataFrame with tract polygons + GEOID, plus precomputed
+    centroid_lon/centroid_lat and minx/miny/maxx/maxy columns.
+    Stored as GeoParquet by cache.geo_store, not as GeoJSON.
+    """
     key = f"tiger:{state_fips}:{county_fips}"
-    cached = cache_get(key)
-    if cached is not None:
-        import json
-        return gpd.GeoDataFrame.from_features(cached["features"], crs="EPSG:4326")
+    return await get_or_build(
+        key,
+        lambda: _download_tract_boundaries(key, state_fips, county_fips),
+        lookup=lookup_tracts_async,
+    )
+
+
+async def fetch_tract_centroids(geoids: list[str]) -> dict[str, tuple[float, float]]:
+    """
+    {GEOID: (lat, lon)} for 11-digit tract GEOIDs, read from each county's
+    stored tracts (one load per county, TRACT_CENTROID_CONCURRENCY at a time).
+    Unknown GEOIDs are left out, including those in a county whose tracts
+    could not be fetched. Counties with no tracts are remembered, so bogus
+    GEOIDs do not reach TIGER again.
+    """
+    global _centroid_slots
+    if _centroid_slots is None:
+        _centroid_slots = asyncio.Semaphore(TRACT_CENTROID_CONCURRENCY)
+    counties = sorted({g[:5] for g in geoids if len(g) == 11 and g.isdigit()})
+    known_empty = await cache_versions_async([_no_tracts_key(fips) for fips in counties])
+    counties = [fips for fips in counties if _no_tracts_key(fips) not in known_empty]
+
+    async def load(fips: str) -> Optional[gpd.GeoDataFrame]:
+        async with _centroid_slots:
+            try:
+                return await fetch_tract_boundaries(fips[:2], fips[2:])
+            except Exception as exc:
+                logger.warning("Tract centroids for county %s unavailable: %r", fips, exc)
+                return None
+
+    gdfs = await asyncio.gather(*(load(fips) for fips in counties))
+    empty = {_no_tracts_key(fips): True for fips, gdf in zip(counties, gdfs) if gdf is not None and gdf.empty}
+    if empty:
+        await cache_set_many_async(empty)
+
+    wanted = set(geoids)
+    centroids = {}
+    for gdf in gdfs:
+        if gdf is None or gdf.empty:
+            continue
+        rows = gdf[gdf["GEOID"].astype(str).isin(wanted)]
+        for geoid, lat, lon in zip(rows["GEOID"].astype(str), rows["centroid_lat"], rows["centroid_lon"]):
+            centroids[geoid] = (float(lat), float(lon))
+    return centroids
+
+
+def _no_tracts_key(fips: str) -> str:
+    return f"tiger:no-tracts:{fips}"
 
+
+def _tracts_from_features(features: list[dict]) -> gpd.GeoDataFrame:
+    if not features:
+        return gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
+    gdf = gpd.GeoDataFrame.from_features(features, crs="EPSG:4326")
+    return with_derived_columns(gdf)
+
+
+def _geometry_params() -> dict:
+    params = {}
+    if TIGER_MAX_ALLOWABLE_OFFSET > 0:
+        params["maxAllowableOffset"] = str(TIGER_MAX_ALLOWABLE_OFFSET)
+    if TIGER_GEOMETRY_PRECISION > 0:
+        params["geometryPrecision"] = str(TIGER_GEOMETRY_PRECISION)
+    return params
+
+
+async def _download_tract_boundaries(key: str, state_fips: str, county_fips: str) -> gpd.GeoDataFrame:
     where = f"STATE='{state_fips}' AND COUNTY='{county_fips}'"
+    url = f"{TIGER_BASE}/{TRACT_LAYER}/query"
+    client = get_client("tiger")
+
+    r = await client.get(url, params={"where": where, "returnCountOnly": "true", "f": "json"})
+    r.raise_for_status()
+    count = int(r.json().get("count", 0))
+
     params = {
         "where": where,
         "outFields": "GEOID,TRACT,STATE,COUNTY,NAME",
         "outSR": "4326",
         "f": "geojson",
         "returnGeometry": "true",
+        # Stable order so pages neither overlap nor skip records
+        "orderByFields": "GEOID",
+        **_geometry_params(),
     }
+    slots = asyncio.Semaphore(TIGER_PAGE_CONCURRENCY)
 
-    url = f"{TIGER_BASE}/{TRACT_LAYER}/query"
-    async with httpx.AsyncClient(timeout=60) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
+    async def fetch_page(offset: int, limit: int) -> list[dict]:
+        # The server may cap a page below our size; keep reading until full
+        features: list[dict] = []
+        async with slots:
+            while len(features) < limit:
+                page = {
+                    "resultOffset": str(offset + len(features)),
+                    "resultRecordCount": str(limit - len(features)),
+                }
+                r = await client.get(url, params={**params, **page})
+                r.raise_for_status()
+                batch = r.json().get("features", [])
+                if not batch:
+                    break
+                features.extend(batch)
+        return features
 
-    geojson = r.json()
-    cache_set(key, geojson)
-    return gpd.GeoDataFrame.from_features(geojson["features"], crs="EPSG:4326")
+    pages = await asyncio.gather(*(
+        fetch_page(offset, min(TIGER_PAGE_SIZE, count - offset))
+        for offset in range(0, count, TIGER_PAGE_SIZE)
+    ))
+    gdf = await run_cpu(_tracts_from_features, [f for page in pages for f in page])
+    if not gdf.empty:
+        await write_tracts_async(key, gdf)
+    return gdf
+
+
+def county_boundary_key(fips: str) -> str:
+    return f"tiger:county:{fips}"
 
 
 async def fetch_county_boundary(fips: str) -> dict:
     """Return county outline as GeoJSON FeatureCollection."""
-    key = f"tiger:county:{fips}"
-    cached = cache_get(key)
-    if cached is not None:
-        return cached
+    key = county_boundary_key(fips)
+    return await get_or_build(key, lambda: _download_county_boundary(key, fips))
+
 
+async def _download_county_boundary(key: str, fips: str) -> dict:
     state_fips = fips[:2]
     county_fips = fips[2:]
     where = f"STATE='{state_fips}' AND COUNTY='{county_fips}'"
-    # County layer = 82 (84 = Zip Code Tabulation Areas)
-    url = f"{TIGER_BASE}/82/query"
+    url = f"{TIGER_BASE}/{COUNTY_LAYER}/query"
     params = {
         "where": where,
         "outFields": "GEOID,NAME,STATE,COUNTY",
         "outSR": "4326",
         "f": "geojson",
         "returnGeometry": "true",
+        **_geometry_params(),
     }
 
-    async with httpx.AsyncClient(timeout=60) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
+    r = await get_client("tiger").get(url, params=params)
+    r.raise_for_status()
 
     geojson = r.json()
-    cache_set(key, geojson)
+    await cache_set_async(key, geojson)
     return geojson
 
 
+async def fetch_county_bbox(fips: str) -> Optional[tuple[float, float, float, float]]:
+    """
+    Return (south, west, north, east) for a county without downloading tracts.
+    Uses the county layer's returnExtentOnly query; None if TIGER has no extent.
+    """
+    key = f"tiger:bbox:{fips}"
+    bbox = await get_or_build(key, lambda: _download_county_bbox(key, fips))
+    return tuple(bbox) if bbox is not None else None
+
+
+async def _download_county_bbox(key: str, fips: str) -> Optional[list[float]]:
+    params = {
+        "where": f"STATE='{fips[:2]}' AND COUNTY='{fips[2:]}'",
+        "returnExtentOnly": "true",
+        "outSR": "4326",
+        "f": "json",
+    }
+    r = await get_client("tiger").get(f"{TIGER_BASE}/{COUNTY_LAYER}/query", params=params)
+    r.raise_for_status()
+
+    extent = r.json().get("extent") or {}
+    try:
+        bbox = [float(extent["ymin"]), float(extent["xmin"]), float(extent["ymax"]), float(extent["xmax"])]
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not all(math.isfinite(v) for v in bbox):
+        return None
+
+    await cache_set_async(key, bbox)
+    return bbox
+
+
+async def fetch_counties_in_bbox(
+    key: str, south: float, west: float, north: float, east: float
+) -> list[str]:
+    """
+    Return the 5-digit FIPS of counties whose outline intersects the bbox,
+    via an envelope query on the county layer (no geometry returned).
+    Cached under the caller's key, e.g. one per map tile.
+    """
+    return await get_or_build(key, lambda: _download_counties_in_bbox(key, south, west, north, east))
+
+
+async def _download_counties_in_bbox(
+    key: str, south: float, west: float, north: float, east: float
+) -> list[str]:
+    params = {
+        "where": "1=1",
+        "geometry": f"{west},{south},{east},{north}",
+        "geometryType": "esriGeometryEnvelope",
+        "inSR": "4326",
+        "spatialRel": "esriSpatialRelIntersects",
+        "outFields": "GEOID",
+        "returnGeometry": "false",
+        "f": "json",
+    }
+    r = await get_client("tiger").get(f"{TIGER_BASE}/{COUNTY_LAYER}/query", params=params)
+    r.raise_for_status()
+
+    fips = sorted({f["attributes"]["GEOID"] for f in r.json().get("features", [])})
+    await cache_set_async(key, fips)
+    return fips
+
+
 def get_county_bbox(gdf: gpd.GeoDataFrame) -> tuple[float, float, float, float]:
     """Return (south, west, north, east) bounding box from GeoDataFrame."""
     bounds = gdf.total_bounds  # (minx, miny, maxx, maxy)
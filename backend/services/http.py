@@ -0,0 +1,55 @@
+"""Application-scoped pooled HTTP clients for upstream services."""
+import importlib.util
+import os
+
+import httpx
+
+USER_AGENT = "CivicDeserts-Dashboard/1.0 (civic-deserts@example.com)"
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2 = os.getenv("HTTP2", "0") == "1" and importlib.util.find_spec("h2") is not None
+
+# One client per upstream host, so connection limits apply per host.
+# Overpass allows only a couple of concurrent slots per IP.
+PROFILES: dict[str, dict] = {
+    "census": {"timeout": httpx.Timeout(30.0), "max_connections": 10},
+    "tiger": {"timeout": httpx.Timeout(60.0), "max_connections": 8},
+    "overpass": {"timeout": httpx.Timeout(90.0), "max_connections": 2},
+    "photon": {"timeout": httpx.Timeout(connect=5.0, read=20.0, write=5.0, pool=5.0), "max_connections": 8},
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _make_client(service: str) -> httpx.AsyncClient:
+    profile = PROFILES[service]
+    limits = httpx.Limits(
+        max_connections=profile["max_connections"],
+        max_keepalive_connections=profile["max_connections"],
+        keepalive_expiry=60.0,
+    )
+    return httpx.AsyncClient(
+        timeout=profile["timeout"],
+        limits=limits,
+        http2=HTTP2,
+        headers={"User-Agent": USER_AGENT},
+    )
+
+
+def get_client(service: str) -> httpx.AsyncClient:
+    """Return the shared client for a service, creating it on first use."""
+    client = _clients.get(service)
+    if client is None or client.is_closed:
+        client = _clients[service] = _make_client(service)
+    return client
+
+
+async def open_clients() -> None:
+    for service in PROFILES:
+        get_client(service)
+
+
+async def close_clients() -> None:
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
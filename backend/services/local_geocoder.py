@@ -0,0 +1,206 @@
+"""
+Offline reverse geocoder: point-in-polygon lookups against neighbourhood,
+place, ZCTA and state polygons held in STRtrees, with no network calls.
+
+Import the polygons once from local files (TIGER/Line shapefiles, zipped or
+not; any polygon file with a name column for neighbourhoods):
+
+    python -m services.local_geocoder \\
+        --places tl_2023_06_place.zip --zctas tl_2020_us_zcta520.zip \\
+        --states tl_2023_us_state.zip [--neighbourhoods hoods.geojson --name-field name]
+
+Each layer is written as GeoParquet under GEOCODER_DIR and is optional.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+logger = logging.getLogger(__name__)
+
+GEOCODER_DIR = Path(os.getenv("GEOCODER_DIR", str(Path(__file__).parent.parent / "cache" / "geocoder")))
+
+# Layer → result field it fills
+LAYER_FIELDS = {
+    "neighbourhoods": "neighbourhood",
+    "places": "city",
+    "zctas": "postcode",
+    "states": "state",
+}
+
+
+class _Layer:
+    def __init__(self, gdf: gpd.GeoDataFrame):
+        self.values = gdf["value"].astype(str).to_numpy(dtype=object)
+        self.state = gdf["state"].to_numpy(dtype=object) if "state" in gdf.columns else None
+        geoms = gdf.geometry.values.to_numpy()
+        self.areas = shapely.area(geoms)
+        self.tree = STRtree(geoms)
+
+    def lookup(self, points: np.ndarray) -> np.ndarray:
+        """Row index of the smallest polygon containing each point, -1 where none does."""
+        point_idx, geom_idx = self.tree.query(points, predicate="intersects")
+        best = np.full(len(points), -1, dtype=np.int64)
+        if len(point_idx):
+            # Group by point with the smallest containing polygon last, keep that one
+            order = np.lexsort((-self.areas[geom_idx], point_idx))
+            point_idx, geom_idx = point_idx[order], geom_idx[order]
+            last = np.append(point_idx[1:] != point_idx[:-1], True)
+            best[point_idx[last]] = geom_idx[last]
+        return best
+
+
+_layers: dict[str, _Layer] = {}
+_loaded = False
+
+
+def load() -> dict[str, int]:
+    """Load whichever layer files exist and build their STRtrees. Returns polygon counts."""
+    global _loaded
+    _layers.clear()
+    for layer in LAYER_FIELDS:
+        path = GEOCODER_DIR / f"{layer}.parquet"
+        if path.exists():
+            _layers[layer] = _Layer(gpd.read_parquet(path))
+    _loaded = True
+    counts = {layer: len(l.values) for layer, l in _layers.items()}
+    if counts:
+        logger.info("Local geocoder layers loaded: %s", counts)
+    return counts
+
+
+def available() -> bool:
+    """True once at least one layer is loaded."""
+    if not _loaded:
+        load()
+    return bool(_layers)
+
+
+def reverse_many(lats, lons) -> list[dict]:
+    """Vectorized reverse(): one {neighbourhood, postcode, city, state} dict per point."""
+    if not _loaded:
+        load()
+    points = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    results = [dict.fromkeys(("neighbourhood", "postcode", "city", "state")) for _ in range(len(points))]
+    for layer, field in LAYER_FIELDS.items():
+        index = _layers.get(layer)
+        if index is None:
+            continue
+        best = index.lookup(points)
+        for result, row in zip(results, best):
+            if row < 0:
+                continue
+            result[field] = index.values[row]
+            # TIGER places carry their state, for points with no state layer
+            if index.state is not None and result["state"] is None:
+                result["state"] = index.state[row]
+    return results
+
+
+def reverse(lat: float, lon: float) -> dict:
+    """{neighbourhood, postcode, city, state} for a point; fields are None where no polygon matches."""
+    return reverse_many([lat], [lon])[0]
+
+
+def _state_names() -> dict[str, str]:
+    from services.static_data import county_records
+    return {c["fips"][:2]: c["state"] for c in county_records()}
+
+
+def _read(path: Path) -> gpd.GeoDataFrame:
+    gdf = gpd.read_file(path)
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(4326)
+    return gdf
+
+
+def _first_column(gdf: gpd.GeoDataFrame, candidates: tuple[str, ...]) -> str:
+    for name in candidates:
+        if name in gdf.columns:
+            return name
+    raise SystemExit(f"None of {candidates} found in columns {list(gdf.columns)}")
+
+
+def import_layers(
+    places: list[Path],
+    zctas: list[Path],
+    states: list[Path],
+    neighbourhoods: list[Path],
+    name_field: str,
+    out_dir: Path,
+) -> dict[str, int]:
+    """Normalize source files to value(/state)+geometry GeoParquet, one file per layer."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    frames: dict[str, list[gpd.GeoDataFrame]] = {}
+    if places:
+        state_names = _state_names()
+        parts = []
+        for path in places:
+            gdf = _read(path)
+            name = _first_column(gdf, ("NAME", "NAME20", "NAME10"))
+            statefp = _first_column(gdf, ("STATEFP", "STATEFP20", "STATEFP10"))
+            parts.append(gpd.GeoDataFrame({
+                "value": gdf[name].astype(str),
+                "state": gdf[statefp].astype(str).map(state_names),
+            }, geometry=gdf.geometry.values, crs=4326))
+        frames["places"] = parts
+    if zctas:
+        parts = []
+        for path in zctas:
+            gdf = _read(path)
+            code = _first_column(gdf, ("ZCTA5CE20", "ZCTA5CE10", "GEOID20", "GEOID10", "ZCTA5"))
+            parts.append(gpd.GeoDataFrame({"value": gdf[code].astype(str)}, geometry=gdf.geometry.values, crs=4326))
+        frames["zctas"] = parts
+    if states:
+        parts = []
+        for path in states:
+            gdf = _read(path)
+            parts.append(gpd.GeoDataFrame({"value": gdf[_first_column(gdf, ("NAME",))].astype(str)},
+                                          geometry=gdf.geometry.values, crs=4326))
+        frames["states"] = parts
+    if neighbourhoods:
+        parts = []
+        for path in neighbourhoods:
+            gdf = _read(path)
+            parts.append(gpd.GeoDataFrame({"value": gdf[name_field].astype(str)}, geometry=gdf.geometry.values, crs=4326))
+        frames["neighbourhoods"] = parts
+
+    counts = {}
+    for layer, parts in frames.items():
+        gdf = gpd.GeoDataFrame(pd.concat(parts, ignore_index=True), geometry="geometry", crs=4326)
+        gdf = gdf[~gdf.geometry.is_empty & gdf.geometry.notna()]
+        path = out_dir / f"{layer}.parquet"
+        tmp = path.with_suffix(".tmp")
+        gdf.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        counts[layer] = len(gdf)
+    return counts
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description="Import polygons for the offline reverse geocoder.")
+    parser.add_argument("--places", type=Path, nargs="*", default=[], help="TIGER place shapefiles")
+    parser.add_argument("--zctas", type=Path, nargs="*", default=[], help="TIGER ZCTA shapefiles")
+    parser.add_argument("--states", type=Path, nargs="*", default=[], help="TIGER state shapefiles")
+    parser.add_argument("--neighbourhoods", type=Path, nargs="*", default=[], help="neighbourhood polygon files")
+    parser.add_argument("--name-field", default="name", help="neighbourhood name column (default: name)")
+    parser.add_argument("--out", type=Path, default=GEOCODER_DIR, help=f"output directory (default {GEOCODER_DIR})")
+    args = parser.parse_args(argv)
+    if not (args.places or args.zctas or args.states or args.neighbourhoods):
+        parser.error("give at least one of --places, --zctas, --states, --neighbourhoods")
+
+    start = time.perf_counter()
+    counts = import_layers(args.places, args.zctas, args.states, args.neighbourhoods, args.name_field, args.out)
+    print(f"Imported {counts} into {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,17 +1,5 @@
 """Local news outlet density service."""
-import json
-from pathlib import Path
-from typing import Optional
-
-_NEWS_FILE = Path(__file__).parent.parent / "cache" / "county_news_counts.json"
-_news_data: Optional[dict] = None
-
-
-def _load() -> dict:
-    global _news_data
-    if _news_data is None:
-        _news_data = json.loads(_NEWS_FILE.read_text())
-    return _news_data
+from services.static_data import news_outlet_count
 
 
 def get_outlet_density(fips: str, census_rows: list[dict]) -> tuple[float, int]:
@@ -19,8 +7,7 @@ def get_outlet_density(fips: str, census_rows: list[dict]) -> tuple[float, int]:
     Returns (outlets_per_100k, raw_outlet_count) for the county.
     Uses tract-level census populations to compute county total.
     """
-    data = _load()
-    outlet_count = data.get(fips, 0)
+    outlet_count = news_outlet_count(fips)
 
     total_pop = sum(row.get("population", 0) for row in census_rows)
     if total_pop <= 0:
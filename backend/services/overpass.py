@@ -1,8 +1,20 @@
 """Overpass API client for OSM POI queries."""
-import httpx
-from cache.file_cache import cache_get, cache_set
+import asyncio
+import math
+import os
+from typing import Optional
+from cache.file_cache import cache_lookup_many_async, cache_set_async, cache_set_many_async
+from cache.singleflight import get_or_build, run_in_background, single_flight
+from services.http import get_client
 
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+# Fetch all layers for a county in one union query and split them locally
+OVERPASS_COMBINED = os.getenv("OVERPASS_COMBINED", "1") == "1"
+# POIs are cached per slippy-map tile at this zoom so neighbouring counties
+# share results; 0 falls back to one cache entry per county bbox
+POI_TILE_ZOOM = int(os.getenv("POI_TILE_ZOOM", "10"))
+# "overpass" (live API) or "local" (index built by services.poi_index)
+POI_SOURCE = os.getenv("POI_SOURCE", "overpass")
 
 LAYER_QUERIES: dict[str, str] = {
     "healthcare": """
@@ -31,6 +43,32 @@ out center;
 """,
 }
 
+# Tag rules equivalent to LAYER_QUERIES, used to split a combined response:
+# (element types, tag key, accepted values)
+LAYER_RULES: dict[str, list[tuple[set[str], str, set[str]]]] = {
+    "healthcare": [
+        ({"node", "way"}, "amenity", {"hospital", "clinic", "pharmacy"}),
+    ],
+    "food": [
+        ({"node", "way"}, "shop", {"supermarket", "grocery"}),
+        ({"node", "way"}, "amenity", {"food_bank"}),
+    ],
+    "transit": [
+        ({"node"}, "public_transport", {"station", "stop_position"}),
+        ({"node"}, "highway", {"bus_stop"}),
+        ({"way"}, "public_transport", {"station"}),
+    ],
+}
+
+
+def classify_tags(osm_type: str, tags: dict) -> list[str]:
+    """Return the layers an OSM element with these tags belongs to."""
+    return [
+        layer
+        for layer, rules in LAYER_RULES.items()
+        if any(osm_type in types and tags.get(tag) in values for types, tag, values in rules)
+    ]
+
 
 async def fetch_pois(
     layer: str,
@@ -42,20 +80,33 @@ async def fetch_pois(
 ) -> list[dict]:
     """Return list of {lat, lon} dicts for POIs of the given layer type."""
     key = f"overpass:{fips}:{layer}"
-    cached = cache_get(key)
-    if cached is not None:
-        return cached
-
-    bbox = f"{south},{west},{north},{east}"
     template = LAYER_QUERIES.get(layer)
     if not template:
         raise ValueError(f"Unknown layer: {layer}")
+    if POI_SOURCE == "local":
+        from services import poi_index
+        return await asyncio.to_thread(poi_index.query_bbox, layer, south, west, north, east)
+    if POI_TILE_ZOOM > 0:
+        return await _pois_from_tiles(layer, south, west, north, east)
+    if OVERPASS_COMBINED:
+        return await get_or_build(key, lambda: _layer_from_combined(layer, south, west, north, east, fips))
+    return await get_or_build(key, lambda: _download_pois(key, template, south, west, north, east))
+
+
+async def _download_pois(
+    key: str,
+    template: str,
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+) -> list[dict]:
+    bbox = f"{south},{west},{north},{east}"
 
     query = f"[out:json][timeout:60];\n{template.format(bbox=bbox)}"
 
-    async with httpx.AsyncClient(timeout=90) as client:
-        r = await client.post(OVERPASS_URL, data={"data": query})
-        r.raise_for_status()
+    r = await get_client("overpass").post(OVERPASS_URL, data={"data": query})
+    r.raise_for_status()
 
     elements = r.json().get("elements", [])
     pois = []
@@ -65,5 +116,173 @@ async def fetch_pois(
         elif el["type"] == "way" and "center" in el:
             pois.append({"lat": el["center"]["lat"], "lon": el["center"]["lon"]})
 
-    cache_set(key, pois)
+    await cache_set_async(key, pois)
     return pois
+
+
+def _element_point(el: dict) -> Optional[dict]:
+    if el["type"] == "node":
+        return {"lat": el["lat"], "lon": el["lon"]}
+    if el["type"] == "way" and "center" in el:
+        return {"lat": el["center"]["lat"], "lon": el["center"]["lon"]}
+    return None
+
+
+def _combined_query(
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    layers: Optional[list[str]] = None,
+) -> str:
+    bbox = f"{south},{west},{north},{east}"
+    statements = [
+        line.strip().format(bbox=bbox)
+        for layer in (layers or LAYER_QUERIES)
+        for line in LAYER_QUERIES[layer].splitlines()
+        if "({bbox})" in line
+    ]
+    body = "\n  ".join(statements)
+    return f"[out:json][timeout:90];\n(\n  {body}\n);\nout tags center;"
+
+
+async def _layer_from_combined(
+    layer: str,
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    fips: str,
+) -> list[dict]:
+    key = f"overpass:{fips}:*"
+    by_layer = await single_flight(key, lambda: _download_all_layers(south, west, north, east, fips))
+    return by_layer[layer]
+
+
+async def _download_all_layers(
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    fips: str,
+) -> dict[str, list[dict]]:
+    """One Overpass round-trip for every layer; fills each overpass:{fips}:{layer} entry."""
+    query = _combined_query(south, west, north, east)
+    r = await get_client("overpass").post(OVERPASS_URL, data={"data": query})
+    r.raise_for_status()
+
+    by_layer: dict[str, list[dict]] = {layer: [] for layer in LAYER_QUERIES}
+    for el in r.json().get("elements", []):
+        poi = _element_point(el)
+        if poi is None:
+            continue
+        for layer in classify_tags(el["type"], el.get("tags", {})):
+            by_layer[layer].append(poi)
+
+    await cache_set_many_async({f"overpass:{fips}:{layer}": pois for layer, pois in by_layer.items()})
+    return by_layer
+
+
+def _tile_xy(lat: float, lon: float) -> tuple[int, int]:
+    """Slippy-map tile containing a point at POI_TILE_ZOOM."""
+    n = 2 ** POI_TILE_ZOOM
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _tile_bounds(x: int, y: int) -> tuple[float, float, float, float]:
+    """(south, west, north, east) of a tile at POI_TILE_ZOOM."""
+    n = 2 ** POI_TILE_ZOOM
+    lat = lambda ty: math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def _tile_key(x: int, y: int, layer: str) -> str:
+    return f"overpass:tile:{POI_TILE_ZOOM}:{x}:{y}:{layer}"
+
+
+async def _pois_from_tiles(layer: str, south: float, west: float, north: float, east: float) -> list[dict]:
+    """
+    Assemble a bbox's POIs from cached tiles. Only missing tiles go to
+    Overpass; stale tiles are served and refreshed in the background.
+    """
+    x0, y0 = _tile_xy(north, west)
+    x1, y1 = _tile_xy(south, east)
+    keys = {_tile_key(x, y, layer): (x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)}
+
+    found = await cache_lookup_many_async(list(keys))
+    tiles = {keys[key]: pois for key, (pois, _fresh) in found.items()}
+    missing = [tile for key, tile in keys.items() if key not in found]
+    stale = [keys[key] for key, (_pois, fresh) in found.items() if not fresh]
+
+    if missing:
+        tiles.update(await _fetch_tiles(missing, layer))
+    if stale:
+        # Straight to the download: run_in_background already holds the flight key
+        run_in_background(*_tiles_download(stale, layer))
+
+    return [
+        poi
+        for tile_pois in tiles.values()
+        for poi in tile_pois
+        if south <= poi["lat"] <= north and west <= poi["lon"] <= east
+    ]
+
+
+def _tiles_flight_key(tiles: list[tuple[int, int]], layer: str) -> str:
+    xs, ys = [x for x, _ in tiles], [y for _, y in tiles]
+    layers = "*" if OVERPASS_COMBINED else layer
+    return f"overpass:tiles:{POI_TILE_ZOOM}:{min(xs)}-{max(xs)}:{min(ys)}-{max(ys)}:{layers}"
+
+
+def _tiles_download(tiles: list[tuple[int, int]], layer: str):
+    """(single-flight key, download callable) for the rectangle of tiles covering `tiles`."""
+    xs, ys = [x for x, _ in tiles], [y for _, y in tiles]
+    layers = list(LAYER_QUERIES) if OVERPASS_COMBINED else [layer]
+    return _tiles_flight_key(tiles, layer), lambda: _download_tiles(min(xs), max(xs), min(ys), max(ys), layers)
+
+
+async def _fetch_tiles(tiles: list[tuple[int, int]], layer: str) -> dict[tuple[int, int], list[dict]]:
+    """Fetch the rectangle of tiles covering `tiles` in one query; return this layer's POIs per tile."""
+    by_tile = await single_flight(*_tiles_download(tiles, layer))
+    return {tile: by_tile[tile][layer] for tile in tiles}
+
+
+async def _download_tiles(
+    x0: int,
+    x1: int,
+    y0: int,
+    y1: int,
+    layers: list[str],
+) -> dict[tuple[int, int], dict[str, list[dict]]]:
+    south, west, _, _ = _tile_bounds(x0, y1)
+    _, _, north, east = _tile_bounds(x1, y0)
+    query = _combined_query(south, west, north, east, layers)
+    r = await get_client("overpass").post(OVERPASS_URL, data={"data": query})
+    r.raise_for_status()
+
+    by_tile = {
+        (x, y): {layer: [] for layer in layers}
+        for x in range(x0, x1 + 1)
+        for y in range(y0, y1 + 1)
+    }
+    for el in r.json().get("elements", []):
+        poi = _element_point(el)
+        if poi is None:
+            continue
+        tile = by_tile.get(_tile_xy(poi["lat"], poi["lon"]))
+        if tile is None:
+            # On the outer edge of the query bbox; belongs to a tile we did not ask for
+            continue
+        for layer in classify_tags(el["type"], el.get("tags", {})):
+            if layer in tile:
+                tile[layer].append(poi)
+
+    await cache_set_many_async({
+        _tile_key(x, y, layer): pois
+        for (x, y), tile in by_tile.items()
+        for layer, pois in tile.items()
+    })
+    return by_tile
@@ -0,0 +1,124 @@
+"""
+Offline POI source: healthcare/food/transit points from a local OSM extract,
+stored in SQLite R*Tree tables (one per layer) for millisecond bbox queries.
+
+Build once (needs the optional pyosmium package: pip install osmium):
+
+    python -m services.poi_index california-latest.osm.pbf
+
+then set POI_SOURCE=local so fetch_pois reads the index instead of Overpass.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from services.overpass import LAYER_QUERIES, LAYER_RULES, classify_tags
+
+POI_INDEX_PATH = Path(os.getenv("POI_INDEX_PATH", str(Path(__file__).parent.parent / "cache" / "poi_index.sqlite3")))
+
+# Only elements carrying one of these keys can match a layer rule
+_RULE_KEYS = {tag for rules in LAYER_RULES.values() for _types, tag, _values in rules}
+
+_local = threading.local()
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        if not POI_INDEX_PATH.exists():
+            raise FileNotFoundError(
+                f"POI index not found at {POI_INDEX_PATH}; build it with "
+                "`python -m services.poi_index <extract.osm.pbf>` or set POI_SOURCE=overpass"
+            )
+        conn = sqlite3.connect(f"file:{POI_INDEX_PATH}?mode=ro", uri=True, check_same_thread=False)
+        _local.conn = conn
+    return conn
+
+
+def query_bbox(layer: str, south: float, west: float, north: float, east: float) -> list[dict]:
+    """Return {lat, lon} dicts for a layer's POIs inside the bbox."""
+    if layer not in LAYER_QUERIES:
+        raise ValueError(f"Unknown layer: {layer}")
+    # R*Tree bounds are float32 (rounded outward), so the index gives a
+    # superset and the exact +lat/+lon columns make the final cut
+    rows = _conn().execute(
+        f"SELECT lat, lon FROM poi_{layer} "
+        "WHERE max_lon >= ? AND min_lon <= ? AND max_lat >= ? AND min_lat <= ? "
+        "AND lon BETWEEN ? AND ? AND lat BETWEEN ? AND ?",
+        (west, east, south, north, west, east, south, north),
+    ).fetchall()
+    return [{"lat": lat, "lon": lon} for lat, lon in rows]
+
+
+def build_index(pbf_path: Path, out_path: Path, batch_size: int = 10_000) -> dict[str, int]:
+    """Read an .osm.pbf once and write the per-layer R*Tree tables. Returns counts per layer."""
+    try:
+        import osmium
+    except ImportError:
+        raise SystemExit("Building the POI index needs pyosmium: pip install osmium")
+
+    tmp_path = out_path.with_suffix(".tmp")
+    tmp_path.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp_path)
+    for layer in LAYER_QUERIES:
+        conn.execute(
+            f"CREATE VIRTUAL TABLE poi_{layer} USING rtree(id, min_lon, max_lon, min_lat, max_lat, +lat, +lon)"
+        )
+
+    pending: dict[str, list[tuple]] = {layer: [] for layer in LAYER_QUERIES}
+    counts = {layer: 0 for layer in LAYER_QUERIES}
+
+    def wanted(tags) -> bool:
+        return any(key in tags for key in _RULE_KEYS)
+
+    def add(osm_type: str, tags, lat: float, lon: float) -> None:
+        for layer in classify_tags(osm_type, {t.k: t.v for t in tags}):
+            counts[layer] += 1
+            pending[layer].append((counts[layer], lon, lon, lat, lat, lat, lon))
+            if len(pending[layer]) >= batch_size:
+                flush(layer)
+
+    def flush(layer: str) -> None:
+        conn.executemany(f"INSERT INTO poi_{layer} VALUES (?, ?, ?, ?, ?, ?, ?)", pending[layer])
+        pending[layer].clear()
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            if wanted(n.tags) and n.location.valid():
+                add("node", n.tags, n.location.lat, n.location.lon)
+
+        def way(self, w):
+            if not wanted(w.tags):
+                return
+            # Overpass `out center` reports the centre of the way's bbox
+            coords = [(nd.lat, nd.lon) for nd in w.nodes if nd.location.valid()]
+            if coords:
+                lats, lons = zip(*coords)
+                add("way", w.tags, (min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2)
+
+    Handler().apply_file(str(pbf_path), locations=True)
+    for layer in LAYER_QUERIES:
+        flush(layer)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, out_path)
+    return counts
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description="Build the offline POI index from an OSM extract.")
+    parser.add_argument("pbf", type=Path, help="path to an .osm.pbf extract")
+    parser.add_argument("--out", type=Path, default=POI_INDEX_PATH, help=f"index path (default {POI_INDEX_PATH})")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    counts = build_index(args.pbf, args.out)
+    print(f"Indexed {counts} into {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
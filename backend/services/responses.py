@@ -0,0 +1,161 @@
+"""
+Precompressed JSON responses with strong ETags, stored in the cache so a hit
+skips both serialization and compression.
+"""
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+
+from cache.file_cache import cache_lookup_async, cache_set_many_async, cache_versions_async, ttl_for
+from cache.singleflight import run_in_background
+from services.executors import run_cpu
+
+# Brotli needs the optional brotli package (pip install brotli)
+BROTLI = importlib.util.find_spec("brotli") is not None
+# Bodies smaller than this are sent uncompressed
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+
+# Preferred first when the client accepts several
+_ENCODINGS = ("br", "gzip")
+
+
+def encode_payload(data) -> tuple[dict, dict[str, bytes]]:
+    """
+    Serialize data once and compress it. Returns (meta, bodies): meta holds the
+    content hash and stored encodings, bodies maps encoding → bytes. Large
+    bodies are stored compressed only; identity is rebuilt from gzip on demand.
+    """
+    body = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+    etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+    if len(body) < RESPONSE_COMPRESS_MIN_BYTES:
+        bodies = {"identity": body}
+    else:
+        bodies = {"gzip": gzip.compress(body, RESPONSE_GZIP_LEVEL, mtime=0)}
+        if BROTLI:
+            import brotli
+            bodies["br"] = brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+    return {"etag": etag, "encodings": list(bodies)}, bodies
+
+
+def _accepted(accept_encoding: str) -> set[str]:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _choose_encoding(request: Request, encodings: list[str]) -> str:
+    accepted = _accepted(request.headers.get("accept-encoding", ""))
+    for encoding in _ENCODINGS:
+        if encoding in encodings and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        # Weak comparison, ignoring the per-encoding suffix
+        tag = tag.removeprefix("W/").strip('"')
+        if tag.split("-", 1)[0] == etag:
+            return True
+    return False
+
+
+def _headers(etag: str, encoding: str, max_age: int) -> dict[str, str]:
+    headers = {
+        # Each content-coding is a distinct representation, so it gets its own strong tag
+        "ETag": f'"{etag}"' if encoding == "identity" else f'"{etag}-{encoding}"',
+        "Cache-Control": f"public, max-age={max_age}",
+        "Vary": "Accept-Encoding",
+    }
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return headers
+
+
+def _entry_key(key: str, source_keys: list[str], versions: dict[str, float]) -> Optional[str]:
+    if len(versions) != len(source_keys):
+        return None
+    stamp = ",".join(f"{versions[k]!r}" for k in source_keys)
+    return f"{key}:{hashlib.blake2b(stamp.encode(), digest_size=8).hexdigest()}"
+
+
+async def cached_json_response(
+    request: Request,
+    key: str,
+    source_keys: list[str],
+    build: Callable[[], Awaitable[object]],
+    max_age: int,
+    refresh: Optional[Callable[[], Awaitable[object]]] = None,
+) -> Response:
+    """
+    Serve build()'s JSON through an encoded-response cache entry.
+    The entry key includes the write timestamps of source_keys, so when a
+    source is rebuilt the next request encodes the new data while old
+    entries simply age out. Only those timestamps are read on a hit or 304;
+    build() loads the sources itself. When a source is past its soft TTL,
+    refresh() (which should read the sources through get_or_build) runs in
+    the background so they get revalidated. If a source is still missing
+    after build(), nothing is stored.
+    """
+    versions = await cache_versions_async(source_keys)
+    entry_key = _entry_key(key, source_keys, versions)
+    meta = None
+    if entry_key is not None:
+        meta, _fresh = await cache_lookup_async(entry_key)
+
+    bodies: dict[str, bytes] = {}
+    if meta is None:
+        data = await build()
+        if entry_key is None:
+            # build() has just cached the sources; key the entry on their versions
+            entry_key = _entry_key(key, source_keys, await cache_versions_async(source_keys))
+        meta, bodies = await run_cpu(encode_payload, data)
+        if entry_key is not None:
+            await cache_set_many_async({
+                entry_key: meta,
+                **{f"{entry_key}:{encoding}": body for encoding, body in bodies.items()},
+            })
+    elif refresh is not None:
+        now = time.time()
+        if any(now - ts > ttl_for(k)[0] for k, ts in versions.items()):
+            run_in_background(f"{key}:refresh", refresh)
+
+    encoding = _choose_encoding(request, meta["encodings"])
+    stored = encoding if encoding in meta["encodings"] else meta["encodings"][0]
+    if _not_modified(request, meta["etag"]):
+        return Response(status_code=304, headers=_headers(meta["etag"], encoding, max_age))
+
+    body = bodies.get(stored)
+    if body is None:
+        body, _fresh = await cache_lookup_async(f"{entry_key}:{stored}")
+    if body is None:
+        # Body evicted independently of its meta entry; re-encode
+        meta, bodies = await run_cpu(encode_payload, await build())
+        body = bodies[stored]
+    if stored != encoding:
+        # Only gzip is stored for large bodies; the client asked for identity
+        body = gzip.decompress(body)
+    return Response(content=body, media_type="application/json", headers=_headers(meta["etag"], encoding, max_age))
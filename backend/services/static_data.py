@@ -0,0 +1,159 @@
+"""
+Static lookup tables (counties, ZIP → county, news outlet counts), loaded
+once at startup into compact arrays indexed by integer FIPS or ZIP code.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_CACHE_DIR = Path(__file__).parent.parent / "cache"
+COUNTIES_FILE = _CACHE_DIR / "counties.json"
+ZIP_FILE = _CACHE_DIR / "zip_to_county.json"
+NEWS_FILE = _CACHE_DIR / "county_news_counts.json"
+# Directory for memory-mapped .npy copies of the code-indexed arrays, so
+# workers on one host share their pages ("" = plain in-process arrays)
+STATIC_MMAP_DIR = os.getenv("STATIC_MMAP_DIR", "")
+
+# Every 5-digit FIPS or ZIP code is a direct array index
+_CODE_SPACE = 100_000
+
+
+class _Tables:
+    def __init__(self):
+        counties = json.loads(COUNTIES_FILE.read_text())
+        self.state_names = sorted({sys.intern(c["state"]) for c in counties})
+        state_index = {name: i for i, name in enumerate(self.state_names)}
+        # Row-oriented county columns, in counties.json order
+        self.fips = np.array([int(c["fips"]) for c in counties], dtype=np.int32)
+        self.names = [sys.intern(c["name"]) for c in counties]
+        self.states = np.array([state_index[c["state"]] for c in counties], dtype=np.uint8)
+
+        row = np.full(_CODE_SPACE, -1, dtype=np.int32)
+        row[self.fips] = np.arange(len(self.fips), dtype=np.int32)
+        self.row_by_fips = _shared("county_row", row, COUNTIES_FILE)
+        self.county_by_zip = _shared("zip_county", _code_map(ZIP_FILE, missing=-1), ZIP_FILE)
+        self.news_by_fips = _shared("news_counts", _code_map(NEWS_FILE, missing=0), NEWS_FILE)
+
+    def nbytes(self) -> int:
+        arrays = (self.fips, self.states, self.row_by_fips, self.county_by_zip, self.news_by_fips)
+        strings = {id(s): sys.getsizeof(s) for s in (*self.names, *self.state_names)}
+        return sum(a.nbytes for a in arrays) + sum(strings.values()) + sys.getsizeof(self.names)
+
+
+def _code_map(path: Path, missing: int) -> np.ndarray:
+    """{"01001": value} JSON → int32 array indexed by code. A missing file logs and yields an all-missing array."""
+    array = np.full(_CODE_SPACE, missing, dtype=np.int32)
+    try:
+        data = json.loads(path.read_text())
+    except FileNotFoundError:
+        logger.warning("Static lookup %s not found; lookups against it will be empty", path.name)
+        return array
+    for code, value in data.items():
+        try:
+            array[int(code)] = int(value)
+        except (ValueError, IndexError):
+            continue
+    return array
+
+
+def _shared(name: str, array: np.ndarray, source: Path) -> np.ndarray:
+    """With STATIC_MMAP_DIR set, persist the array as .npy (when the source is newer) and map it read-only."""
+    if not STATIC_MMAP_DIR:
+        return array
+    path = Path(STATIC_MMAP_DIR) / f"{name}.npy"
+    source_mtime = source.stat().st_mtime if source.exists() else 0
+    if not path.exists() or path.stat().st_mtime < source_mtime:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+    return np.load(path, mmap_mode="r")
+
+
+_tables: Optional[_Tables] = None
+_stats: dict = {}
+
+
+def _max_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process; None where `resource` is unavailable (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def load() -> dict:
+    """(Re)load every table; called from the app lifespan. Returns load stats."""
+    global _tables, _stats
+    start = time.perf_counter()
+    _tables = _Tables()
+    _stats = {
+        "load_ms": round((time.perf_counter() - start) * 1000, 1),
+        "counties": len(_tables.names),
+        "zips": int((_tables.county_by_zip >= 0).sum()),
+        "news_counties": int((_tables.news_by_fips > 0).sum()),
+        "bytes": _tables.nbytes(),
+        "mmap": bool(STATIC_MMAP_DIR),
+        "max_rss_bytes": _max_rss_bytes(),
+    }
+    logger.info("Static lookups loaded: %s", _stats)
+    return _stats
+
+
+def _get() -> _Tables:
+    if _tables is None:
+        load()
+    return _tables
+
+
+def stats() -> dict:
+    return dict(_stats)
+
+
+def county_records() -> list[dict]:
+    """Every county as {fips, name, state, full}, in counties.json order."""
+    t = _get()
+    return [_record(t, i) for i in range(len(t.names))]
+
+
+def _record(t: _Tables, i: int) -> dict:
+    name, state = t.names[i], t.state_names[t.states[i]]
+    return {"fips": f"{t.fips[i]:05d}", "name": name, "state": state, "full": f"{name}, {state}"}
+
+
+def _code(value: str) -> int:
+    return int(value) if len(value) == 5 and value.isdigit() else -1
+
+
+def county(fips: str) -> Optional[dict]:
+    """{fips, name, state, full} for a 5-digit FIPS, or None."""
+    t = _get()
+    code = _code(fips)
+    row = int(t.row_by_fips[code]) if code >= 0 else -1
+    return _record(t, row) if row >= 0 else None
+
+
+def county_for_zip(zip_code: str) -> Optional[dict]:
+    """County record for a 5-digit ZIP via the ZCTA crosswalk, or None."""
+    t = _get()
+    code = _code(zip_code)
+    fips = int(t.county_by_zip[code]) if code >= 0 else -1
+    return county(f"{fips:05d}") if fips >= 0 else None
+
+
+def news_outlet_count(fips: str) -> int:
+    """Local news outlets recorded for a county (0 if unknown)."""
+    code = _code(fips)
+    return int(_get().news_by_fips[code]) if code >= 0 else 0
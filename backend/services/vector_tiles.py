@@ -0,0 +1,99 @@
+"""
+Mapbox Vector Tiles for gap layers, cut from per-county tract geometry and
+score tables. Encoding needs the optional mapbox-vector-tile package
+(pip install mapbox-vector-tile).
+"""
+import importlib.util
+import math
+import os
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from services.gap_calculator import table_rows
+
+MVT_AVAILABLE = importlib.util.find_spec("mapbox_vector_tile") is not None
+
+# Below this zoom a tile spans too many counties to build on demand
+MVT_MIN_ZOOM = int(os.getenv("MVT_MIN_ZOOM", "7"))
+MVT_MAX_ZOOM = int(os.getenv("MVT_MAX_ZOOM", "16"))
+# Below this zoom tiles only show counties whose scores are already cached
+MVT_BUILD_MIN_ZOOM = int(os.getenv("MVT_BUILD_MIN_ZOOM", "9"))
+# Cold county builds started by tile requests at once, across all tiles
+MVT_BUILD_CONCURRENCY = int(os.getenv("MVT_BUILD_CONCURRENCY", "2"))
+MVT_EXTENT = 4096
+# Geometry kept outside the tile edge, in tile units, so strokes join cleanly
+MVT_BUFFER = 64
+
+_EARTH_RADIUS = 6378137.0
+_MAX_LAT = 85.0511
+
+# Layer-independent properties the map does not need per tile
+_SKIP_PROPERTIES = {"centroid_lat", "centroid_lon"}
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(south, west, north, east) of a slippy-map tile in degrees."""
+    n = 2 ** z
+    lat = lambda ty: math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def tile_bounds_mercator(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(minx, miny, maxx, maxy) of a slippy-map tile in EPSG:3857 metres."""
+    size = 2 * math.pi * _EARTH_RADIUS / 2 ** z
+    origin = math.pi * _EARTH_RADIUS
+    return x * size - origin, origin - (y + 1) * size, (x + 1) * size - origin, origin - y * size
+
+
+def _to_mercator(coords: np.ndarray) -> np.ndarray:
+    lon = np.radians(coords[:, 0])
+    lat = np.radians(np.clip(coords[:, 1], -_MAX_LAT, _MAX_LAT))
+    return np.column_stack([_EARTH_RADIUS * lon, _EARTH_RADIUS * np.log(np.tan(np.pi / 4 + lat / 2))])
+
+
+def encode_tile(layer: str, z: int, x: int, y: int, counties: list[tuple[gpd.GeoDataFrame, dict]]) -> bytes:
+    """
+    Encode one tile from (tract GeoDataFrame, score table) pairs: tracts are
+    filtered by their precomputed bbox, projected to Web Mercator, clipped to
+    the buffered tile and simplified to half a tile unit.
+    """
+    import mapbox_vector_tile
+
+    minx, miny, maxx, maxy = tile_bounds_mercator(z, x, y)
+    pad = (maxx - minx) * MVT_BUFFER / MVT_EXTENT
+    tolerance = (maxx - minx) / MVT_EXTENT / 2
+
+    south, west, north, east = tile_bounds(z, x, y)
+    pad_deg = (east - west) * MVT_BUFFER / MVT_EXTENT
+
+    features = []
+    for tract_gdf, table in counties:
+        in_view = tract_gdf[
+            (tract_gdf["maxx"] >= west - pad_deg) & (tract_gdf["minx"] <= east + pad_deg)
+            & (tract_gdf["maxy"] >= south - pad_deg) & (tract_gdf["miny"] <= north + pad_deg)
+        ]
+        if in_view.empty:
+            continue
+        rows = {row["geoid"]: row for row in table_rows(table)}
+        geoms = shapely.transform(in_view.geometry.values.to_numpy(), _to_mercator)
+        geoms = shapely.clip_by_rect(geoms, minx - pad, miny - pad, maxx + pad, maxy + pad)
+        geoms = shapely.simplify(geoms, tolerance, preserve_topology=True)
+        for geoid, geom in zip(in_view["GEOID"].astype(str), geoms):
+            row = rows.get(geoid)
+            if row is None or geom.is_empty:
+                continue
+            properties = {k: v for k, v in row.items() if v is not None and k not in _SKIP_PROPERTIES}
+            features.append({"geometry": geom, "properties": properties})
+
+    if not features:
+        return b""
+    return mapbox_vector_tile.encode(
+        {"name": layer, "features": features},
+        default_options={
+            "quantize_bounds": (minx, miny, maxx, maxy),
+            "extents": MVT_EXTENT,
+            "on_invalid_geometry": mapbox_vector_tile.encoder.on_invalid_geometry_make_valid,
+        },
+    )
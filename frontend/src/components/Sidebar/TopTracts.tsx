@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
-import type { TopTract, LayerType } from '../../types';
+import type { GeocodeResult, TopTract, LayerType } from '../../types';
 import { scoreToColor } from '../../lib/colors';
-import { useGeocode } from '../../hooks/useGeocode';
+import { useTractLocations } from '../../hooks/useGeocode';
 
 interface Props {
   tracts: TopTract[];
@@ -102,16 +102,12 @@ interface TractCardProps {
   tract: TopTract;
   rank: number;
   activeLayer: LayerType;
+  geo: GeocodeResult | undefined;
+  geoLoading: boolean;
 }
 
-function TractCard({ tract, rank, activeLayer }: TractCardProps) {
+function TractCard({ tract, rank, activeLayer, geo, geoLoading }: TractCardProps) {
   const [expanded, setExpanded] = useState(false);
-  const hasCoords = tract.centroid_lat != null && tract.centroid_lon != null;
-  const { data: geo, isLoading: geoLoading } = useGeocode(
-    tract.centroid_lat,
-    tract.centroid_lon,
-    expanded && hasCoords,
-  );
 
   const isNews = activeLayer === 'news';
   const displayName = tract.name.replace(/, [^,]+$/, '') || `Tract ${tract.geoid.slice(-6)}`;
@@ -255,6 +251,8 @@ function TractCard({ tract, rank, activeLayer }: TractCardProps) {
 }
 
 export function TopTracts({ tracts, isLoading, activeLayer }: Props) {
+  const { data: locations, isLoading: locationsLoading } = useTractLocations(tracts);
+
   if (isLoading) {
     return (
       <div className="space-y-2">
@@ -274,7 +272,14 @@ export function TopTracts({ tracts, isLoading, activeLayer }: Props) {
       </p>
       <ol className="space-y-2">
         {tracts.map((tract, i) => (
-          <TractCard key={tract.geoid} tract={tract} rank={i + 1} activeLayer={activeLayer} />
+          <TractCard
+            key={tract.geoid}
+            tract={tract}
+            rank={i + 1}
+            activeLayer={activeLayer}
+            geo={locations?.[tract.geoid]}
+            geoLoading={locationsLoading}
+          />
         ))}
       </ol>
     </div>
@@ -1,27 +1,67 @@
+import { useMemo } from 'react';
 import { useQuery } from '@tanstack/react-query';
-import type { GapGeoJSON, LayerType, TopTract } from '../types';
+import type { GapGeoJSON, GapScores, LayerType, TopTract, TractGeometry, TractProperties } from '../types';
 
 const API_BASE = import.meta.env.VITE_API_BASE_URL ?? '';
 
-async function fetchGapData(fips: string, layer: LayerType): Promise<GapGeoJSON> {
-  const r = await fetch(`${API_BASE}/api/gap/${fips}?layer=${layer}`);
-  if (!r.ok) throw new Error(`Gap data fetch failed: ${r.statusText}`);
+async function fetchTractGeometry(fips: string): Promise<TractGeometry> {
+  const r = await fetch(`${API_BASE}/api/gap/${fips}/geometry`);
+  if (!r.ok) throw new Error(`Tract geometry fetch failed: ${r.statusText}`);
   return r.json();
 }
 
+async function fetchGapScores(fips: string, layer: LayerType): Promise<GapScores> {
+  const r = await fetch(`${API_BASE}/api/gap/${fips}/scores?layer=${layer}&fields=all`);
+  if (!r.ok) throw new Error(`Gap scores fetch failed: ${r.statusText}`);
+  return r.json();
+}
+
+function joinScores(geometry: TractGeometry, scores: GapScores, layer: LayerType): GapGeoJSON {
+  const columns = scores.layers[layer] ?? {};
+  const fields = Object.keys(columns);
+  const rowByGeoid = new Map(scores.geoid.map((geoid, i) => [geoid, i]));
+  return {
+    type: 'FeatureCollection',
+    features: geometry.features.flatMap((f) => {
+      const i = rowByGeoid.get(f.properties.geoid);
+      if (i === undefined) return [];
+      const properties: Record<string, unknown> = { geoid: f.properties.geoid };
+      for (const field of fields) properties[field] = columns[field][i];
+      return [{ type: 'Feature' as const, geometry: f.geometry, properties: properties as unknown as TractProperties }];
+    }),
+  };
+}
+
 async function fetchTopTracts(fips: string, layer: LayerType): Promise<TopTract[]> {
   const r = await fetch(`${API_BASE}/api/gap/${fips}/top-tracts?layer=${layer}`);
   if (!r.ok) throw new Error(`Top tracts fetch failed: ${r.statusText}`);
   return r.json();
 }
 
+// Polygons are fetched once per county; switching layers only refetches the
+// geometry-free score columns and joins them on geoid.
 export function useGapData(fips: string | null, layer: LayerType) {
-  return useQuery({
-    queryKey: ['gap', fips, layer],
-    queryFn: () => fetchGapData(fips!, layer),
+  const geometry = useQuery({
+    queryKey: ['gap-geometry', fips],
+    queryFn: () => fetchTractGeometry(fips!),
+    enabled: !!fips,
+    staleTime: 1000 * 60 * 60 * 24,
+  });
+  const scores = useQuery({
+    queryKey: ['gap-scores', fips, layer],
+    queryFn: () => fetchGapScores(fips!, layer),
     enabled: !!fips,
     staleTime: 1000 * 60 * 60 * 24,
   });
+  const data = useMemo(
+    () => (geometry.data && scores.data ? joinScores(geometry.data, scores.data, layer) : undefined),
+    [geometry.data, scores.data, layer]
+  );
+  return {
+    data,
+    isFetching: geometry.isFetching || scores.isFetching,
+    error: geometry.error ?? scores.error,
+  };
 }
 
 export function useTopTracts(fips: string | null, layer: LayerType) {
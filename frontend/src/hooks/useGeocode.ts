@@ -1,29 +1,27 @@
 import { useQuery } from '@tanstack/react-query';
+import type { GeocodeResult, TopTract } from '../types';
 
 const API_BASE = import.meta.env.VITE_API_BASE_URL ?? '';
 
-export interface GeocodeResult {
-  neighbourhood: string | null;
-  postcode: string | null;
-  city: string | null;
-  state: string | null;
-}
-
-async function fetchGeocode(lat: number, lon: number): Promise<GeocodeResult> {
-  const r = await fetch(`${API_BASE}/api/tracts/geocode?lat=${lat}&lon=${lon}`);
+async function fetchLocations(tracts: TopTract[]): Promise<Record<string, GeocodeResult>> {
+  const r = await fetch(`${API_BASE}/api/tracts/geocode/batch`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ items: tracts.map((t) => ({ lat: t.centroid_lat, lon: t.centroid_lon })) }),
+  });
   if (!r.ok) throw new Error('Geocode failed');
-  return r.json();
+  const results: GeocodeResult[] = await r.json();
+  return Object.fromEntries(tracts.map((t, i) => [t.geoid, results[i]]));
 }
 
-export function useGeocode(
-  lat: number | null | undefined,
-  lon: number | null | undefined,
-  enabled: boolean,
-) {
+// One batch request for the whole list, separate from the ranking so the
+// cards render immediately and location lines fill in when it answers.
+export function useTractLocations(tracts: TopTract[]) {
+  const located = tracts.filter((t) => t.centroid_lat != null && t.centroid_lon != null);
   return useQuery({
-    queryKey: ['geocode', lat != null ? lat.toFixed(2) : null, lon != null ? lon.toFixed(2) : null],
-    queryFn: () => fetchGeocode(lat!, lon!),
-    enabled: enabled && lat != null && lon != null,
+    queryKey: ['geocode', ...located.map((t) => t.geoid)],
+    queryFn: () => fetchLocations(located),
+    enabled: located.length > 0,
     staleTime: Infinity,
     gcTime: 1000 * 60 * 60 * 24,
     retry: false,
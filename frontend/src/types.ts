@@ -22,7 +22,20 @@ export interface TractProperties {
   outlet_count?: number;
 }
 
-export interface TopTract extends TractProperties {}
+export interface GeocodeResult {
+  neighbourhood: string | null;
+  postcode: string | null;
+  city: string | null;
+  state: string | null;
+}
+
+export interface TopTract extends TractProperties {
+  population?: number;
+  rank?: number;
+  percentile?: number;
+  // Only with top-tracts?geocode=true (the sidebar geocodes via /tracts/geocode/batch)
+  geocode?: GeocodeResult;
+}
 
 export interface GapGeoJSON {
   type: 'FeatureCollection';
@@ -32,3 +45,17 @@ export interface GapGeoJSON {
     properties: TractProperties;
   }>;
 }
+
+export interface GapScores {
+  geoid: string[];
+  layers: Partial<Record<LayerType, Record<string, Array<string | number | null>>>>;
+}
+
+export interface TractGeometry {
+  type: 'FeatureCollection';
+  features: Array<{
+    type: 'Feature';
+    geometry: GeoJSON.Geometry;
+    properties: { geoid: string };
+  }>;
+}